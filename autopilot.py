@@ -1,24 +1,24 @@
-import sqlite3, os
+import os, sys
 from openai import OpenAI
 from dotenv import load_dotenv
 from datetime import datetime
+from llm_cache import cached_completion
+from batch_jobs import get_client, init_batch_tables, submit_batch, collect_batches
+from scheduler import run_prioritized, get_deadline, bounded_client
+from db import get_conn, get_selected_story, get_unprepped_stories, get_script, save_script
 
 # --- CONFIGURATION ---
 load_dotenv(dotenv_path="env.txt")
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY").strip())
+PROMPT_VERSION = 'prep-v1'  # Bump when the script prompt changes so cached scripts are ignored
 
 def init_autopilot_db():
-    conn = sqlite3.connect('magic_rundown.db')
-    c = conn.cursor()
-    # Unified 8-column schema to match dashboard and filter
-    c.execute('''CREATE TABLE IF NOT EXISTS radio_scripts
-                 (id TEXT PRIMARY KEY, tease TEXT, full_story TEXT, 
-                  source_name TEXT, link TEXT, timestamp DATETIME, 
-                  is_aired INTEGER DEFAULT 0, category TEXT DEFAULT 'general')''')
-    conn.commit()
+    conn = get_conn()
+    init_batch_tables(conn)
     return conn
 
-def write_prep(title, summary):
+def build_prep_request(title, summary):
+    """Chat completion body for one script (shared by live writing and the Batch API)."""
     # Added strict character counts and a unique delimiter (###) for 100% reliable splitting
     prompt = f"""
     Write a short radio news script based on the article. 
@@ -36,68 +36,85 @@ def write_prep(title, summary):
     ###
     [Full story here]
     """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-        content = response.choices[0].message.content.strip()
+    return dict(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], temperature=0.3)
+
+def parse_prep(title, content):
+    content = content.strip()
+    # Split by the unique delimiter instead of fragile string searches
+    if "###" in content:
+        parts = content.split("###")
+        tease = parts[0].strip()
+        story = parts[1].strip()
+    else:
+        # Fallback that still avoids "Hook Inside"
+        tease = title[:60] + "..."
+        story = content
         
-        # Split by the unique delimiter instead of fragile string searches
-        if "###" in content:
-            parts = content.split("###")
-            tease = parts[0].strip()
-            story = parts[1].strip()
-        else:
-            # Fallback that still avoids "Hook Inside"
-            tease = title[:60] + "..."
-            story = content
-            
-        return tease, story
+    return tease, story
+
+def write_prep(title, summary, llm_client=client):
+    try:
+        content = cached_completion(llm_client, PROMPT_VERSION, **build_prep_request(title, summary))
+        return parse_prep(title, content)
     except:
         return None, None
 
-def run_autopilot():
+def ingest_batch_scripts(conn):
+    """Stores scripts from any overnight batches that have finished since the last run."""
+    ingested = 0
+    for s_id, content in collect_batches(get_client(), conn, 'prep'):
+        row = get_selected_story(conn, s_id)
+        # A script written live or edited in the dashboard while the batch was out wins
+        if not content or not row or get_script(conn, s_id): continue
+        title, _, link, ts, cat, _ = row
+        tease, story = parse_prep(title, content)
+        save_script(conn, s_id, tease, story, link, ts, cat)
+        ingested += 1
+        print(f"   + Batch script: {title[:50]}... DONE")
+    conn.commit()
+    return ingested
+
+def run_autopilot(batch=False, deadline=None):
+    """Writes scripts live, or with batch=True collects finished Batch API scripts and submits the rest.
+
+    Live scripts are written a few at a time, best score first then freshest. Anything not started
+    by `deadline` stays queued for the next run.
+    """
     conn = init_autopilot_db()
-    c = conn.cursor()
     
     total_written = 0
-    print(f"\n🚀 STARTING MAGIC AUTOPILOT: {datetime.now().strftime('%H:%M:%S')}")
+    print(f"\n🚀 STARTING MAGIC AUTOPILOT{' (BATCH MODE)' if batch else ''}: {datetime.now().strftime('%H:%M:%S')}")
     print("-" * 65)
 
+    if batch:
+        total_written += ingest_batch_scripts(conn)
+
     # CRITICAL FIX: Explicitly selecting today's stories and high scores
     # We join or check against the ID to ensure we only process "un-prepped" stories
-    c.execute("""
-        SELECT id, title, summary, link, timestamp, category 
-        FROM selected_stories 
-        WHERE score >= 8 
-        AND id NOT IN (SELECT id FROM radio_scripts)
-        ORDER BY timestamp DESC
-    """)
-    
-    queue = c.fetchall()
+    queue = get_unprepped_stories(conn, 8, skip_batched=True)
     
     if not queue:
         print(f"✅ No new high-scoring stories found in selected_stories table.")
+    elif batch:
+        # Overnight: half-price Batch API, scripts are picked up on a later run
+        requests = [(s_id, build_prep_request(title, summary)) for s_id, title, summary, link, ts, cat, score in queue]
+        batch_id = submit_batch(get_client(), conn, 'prep', requests)
+        print(f"📤 Submitted {len(requests)} scripts as batch {batch_id}. Run with --batch again to collect.")
     else:
-        print(f"✍️  Writing scripts for {len(queue)} stories...")
+        print(f"✍️  Writing scripts for {len(queue)} stories..."
+              + (f" (deadline {deadline.strftime('%H:%M')})" if deadline else ""))
 
-        for s_id, title, summary, link, ts, cat in queue:
+        finished = 0
+        for (s_id, title, summary, link, ts, cat, score), result in run_prioritized(
+                queue, lambda item: write_prep(item[1], item[2], bounded_client(client, deadline)), deadline=deadline):
+            finished += 1
+            tease, story = result or (None, None)
             print(f"   + Prepping: {title[:50]}...", end=" ", flush=True)
             
-            tease, story = write_prep(title, summary)
-            
             if tease and story:
-                domain = link.split('/')[2].replace('www.', '')
-                
                 try:
-                    # EXACTLY 8 VALUES: id, tease, story, source, link, ts, aired, cat
-                    c.execute("""
-                        INSERT OR REPLACE INTO radio_scripts 
-                        (id, tease, full_story, source_name, link, timestamp, is_aired, category) 
-                        VALUES (?, ?, ?, ?, ?, ?, 0, ?)
-                    """, (s_id, tease, story, domain, link, ts, cat))
+                    save_script(conn, s_id, tease, story, link, ts, cat)
+                    conn.commit()
                     total_written += 1
                     print("DONE")
                 except Exception as e:
@@ -105,10 +122,12 @@ def run_autopilot():
             else:
                 print("FAILED (AI Error)")
 
+        if finished < len(queue):
+            print(f"⏰ Deadline reached: {len(queue) - finished} stories left queued for the next run.")
+
     conn.commit()
-    conn.close()
     print("-" * 65)
     print(f"✅ AUTOPILOT COMPLETE: {total_written} scripts processed.")
 
 if __name__ == "__main__":
-    run_autopilot()
\ No newline at end of file
+    run_autopilot(batch='--batch' in sys.argv, deadline=get_deadline(sys.argv))
\ No newline at end of file
@@ -0,0 +1,102 @@
+import json
+import os
+from datetime import datetime
+from openai import OpenAI
+from dotenv import load_dotenv
+
+# --- CONFIGURATION ---
+# Point OPENAI_BASE_URL at batch_standin.py to try the whole flow without spending anything
+load_dotenv(dotenv_path="env.txt")
+BATCH_DIR = 'batches'        # Submitted JSONL files are kept here for reference
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+def get_client():
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY").strip())
+
+def init_batch_tables(conn):
+    c = conn.cursor()
+    # One row per submitted OpenAI batch, plus which story each request line belongs to
+    c.execute('''CREATE TABLE IF NOT EXISTS llm_batches
+                 (batch_id TEXT PRIMARY KEY, kind TEXT, status TEXT, input_path TEXT,
+                  request_count INTEGER, created_at DATETIME, completed_at DATETIME)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS llm_batch_items
+                 (batch_id TEXT, custom_id TEXT, kind TEXT, story_id TEXT,
+                  PRIMARY KEY (batch_id, custom_id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_llm_batch_items_story ON llm_batch_items(kind, story_id)")
+    conn.commit()
+
+def submit_batch(client, conn, kind, requests):
+    """Writes [(story_id, chat_completion_body), ...] as a JSONL batch file, submits it and records it.
+
+    Returns the batch id.
+    """
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    path = os.path.join(BATCH_DIR, f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl")
+    items = []
+    with open(path, 'w') as f:
+        for i, (story_id, body) in enumerate(requests):
+            # Story ids are long feed URLs; short custom ids keep the file small
+            custom_id = f"{kind}-{i}"
+            items.append((custom_id, story_id))
+            f.write(json.dumps({"custom_id": custom_id, "method": "POST",
+                                "url": "/v1/chat/completions", "body": body}) + "\n")
+
+    with open(path, 'rb') as f:
+        batch_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=batch_file.id, endpoint="/v1/chat/completions",
+                                  completion_window="24h")
+
+    c = conn.cursor()
+    c.execute("""
+        INSERT INTO llm_batches (batch_id, kind, status, input_path, request_count, created_at)
+        VALUES (?, ?, ?, ?, ?, datetime('now'))
+    """, (batch.id, kind, batch.status, path, len(items)))
+    c.executemany("INSERT INTO llm_batch_items (batch_id, custom_id, kind, story_id) VALUES (?, ?, ?, ?)",
+                  [(batch.id, custom_id, kind, story_id) for custom_id, story_id in items])
+    conn.commit()
+    return batch.id
+
+def parse_output_line(line):
+    """Returns (custom_id, message text or None) for one line of a batch output file."""
+    record = json.loads(line)
+    response = record.get('response') or {}
+    if record.get('error') or response.get('status_code') != 200:
+        return record.get('custom_id'), None
+    try:
+        return record['custom_id'], response['body']['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError):
+        return record.get('custom_id'), None
+
+def collect_batches(client, conn, kind):
+    """Checks every open batch of this kind and returns [(story_id, content or None)] for the finished ones.
+
+    Finished batches are closed out so their stories can be submitted again if they failed.
+    """
+    c = conn.cursor()
+    c.execute("SELECT batch_id FROM llm_batches WHERE kind = ? AND status NOT IN (?, ?, ?, ?)",
+              (kind, *TERMINAL_STATUSES))
+    results = []
+    for (batch_id,) in c.fetchall():
+        batch = client.batches.retrieve(batch_id)
+        if batch.status not in TERMINAL_STATUSES:
+            c.execute("UPDATE llm_batches SET status = ? WHERE batch_id = ?", (batch.status, batch_id))
+            print(f"⏳ Batch {batch_id}: {batch.status}")
+            continue
+
+        c.execute("SELECT custom_id, story_id FROM llm_batch_items WHERE batch_id = ?", (batch_id,))
+        story_ids = dict(c.fetchall())
+        answers = {}
+        if batch.status == 'completed' and batch.output_file_id:
+            for line in client.files.content(batch.output_file_id).text.splitlines():
+                if line.strip():
+                    custom_id, content = parse_output_line(line)
+                    answers[custom_id] = content
+        print(f"📦 Batch {batch_id}: {batch.status}, {sum(1 for a in answers.values() if a)}/{len(story_ids)} answers")
+
+        # Anything without an answer goes back to the normal queue
+        results += [(story_id, answers.get(custom_id)) for custom_id, story_id in story_ids.items()]
+        c.execute("UPDATE llm_batches SET status = ?, completed_at = datetime('now') WHERE batch_id = ?",
+                  (batch.status, batch_id))
+        c.execute("DELETE FROM llm_batch_items WHERE batch_id = ?", (batch_id,))
+    conn.commit()
+    return results
@@ -0,0 +1,110 @@
+"""Local stand-in for the OpenAI files + batches endpoints, for trying --batch mode for free.
+
+    python batch_standin.py            # listens on 127.0.0.1:8799
+    OPENAI_BASE_URL=http://127.0.0.1:8799/v1 python filter.py --batch
+    OPENAI_BASE_URL=http://127.0.0.1:8799/v1 python filter.py --batch   # second run ingests
+
+Batches report 'in_progress' the first time they are checked and 'completed' after that, so the
+submit / wait / ingest cycle behaves like the real thing. Answers are canned: a score of 7 for
+scoring prompts, a tease + '###' + story for script prompts.
+"""
+import json
+import sys
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 8799
+FILES = {}     # file id -> bytes
+BATCHES = {}   # batch id -> batch dict
+
+def canned_answer(body):
+    prompt = body['messages'][-1]['content']
+    if 'Return ONLY the number' in prompt:
+        return "7"
+    return "Stand-in tease for the morning show.\n###\nStand-in full story, read it like you mean it."
+
+def run_batch(input_file_id):
+    lines = []
+    for line in FILES[input_file_id].decode().splitlines():
+        if not line.strip(): continue
+        request = json.loads(line)
+        completion = {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+            "model": request['body'].get('model', 'gpt-4o-mini'),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": canned_answer(request['body'])}}],
+        }
+        lines.append(json.dumps({"id": f"req-{uuid.uuid4().hex[:12]}", "custom_id": request['custom_id'],
+                                 "response": {"status_code": 200, "body": completion}, "error": None}))
+    output_id = f"file-{uuid.uuid4().hex[:12]}"
+    FILES[output_id] = ("\n".join(lines) + "\n").encode()
+    return output_id, len(lines)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        if self.path.endswith('/files'):
+            # multipart/form-data with 'purpose' and 'file' parts
+            raw = self.read_body()
+            msg = BytesParser(policy=default).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + raw)
+            file_id = f"file-{uuid.uuid4().hex[:12]}"
+            for part in msg.iter_parts():
+                if part.get_param('name', header='content-disposition') == 'file':
+                    FILES[file_id] = part.get_payload(decode=True)
+            return self.send_json({"id": file_id, "object": "file", "bytes": len(FILES.get(file_id, b'')),
+                                   "created_at": int(time.time()), "filename": "batch.jsonl",
+                                   "purpose": "batch", "status": "processed"})
+
+        if self.path.endswith('/batches'):
+            request = json.loads(self.read_body())
+            batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+            BATCHES[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request['endpoint'],
+                "input_file_id": request['input_file_id'], "completion_window": request['completion_window'],
+                "status": "validating", "created_at": int(time.time()), "output_file_id": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            }
+            return self.send_json(BATCHES[batch_id])
+
+        self.send_json({"error": {"message": f"stand-in does not handle POST {self.path}"}}, 404)
+
+    def do_GET(self):
+        parts = self.path.rstrip('/').split('/')
+        if len(parts) >= 2 and parts[-2] == 'batches' and parts[-1] in BATCHES:
+            batch = BATCHES[parts[-1]]
+            if batch['status'] == 'validating':
+                batch['status'] = 'in_progress'
+            elif batch['status'] == 'in_progress':
+                batch['output_file_id'], total = run_batch(batch['input_file_id'])
+                batch['status'] = 'completed'
+                batch['request_counts'] = {"total": total, "completed": total, "failed": 0}
+            return self.send_json(batch)
+
+        if len(parts) >= 3 and parts[-1] == 'content' and parts[-2] in FILES:
+            data = FILES[parts[-2]]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/jsonl')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            return self.wfile.write(data)
+
+        self.send_json({"error": {"message": f"stand-in does not handle GET {self.path}"}}, 404)
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    print(f"🧪 OpenAI batch stand-in on http://127.0.0.1:{port}/v1")
+    ThreadingHTTPServer(('127.0.0.1', port), StandInHandler).serve_forever()
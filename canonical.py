@@ -0,0 +1,56 @@
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query params that only exist for tracking; they never change which article you get
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'mc_cid', 'mc_eid', 'ref', 'ref_src',
+    'ref_url', 'cmpid', 'smid', 'smtyp', 'taid', 'ito', 'ncid', 'sr_share',
+    'outputtype', 'amp', 'soc_src', 'soc_trk', 'trk',
+}
+# Mobile / AMP host prefixes that serve the same article as the main site
+HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'amp.')
+AMP_PATH = re.compile(r'(/amp/?$|\.amp(\.html)?$|^/amp(?=/))')
+
+def canonicalize_url(url):
+    """Normalizes a story link so the same article always maps to the same string.
+
+    Strips utm_*/fbclid-style tracking, unifies www/mobile/AMP hosts and AMP paths,
+    drops fragments and trailing slashes.
+    """
+    if not url: return url
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+
+    host = (parts.hostname or '').lower()
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in HOST_PREFIXES:
+            if host.startswith(prefix):
+                host = host[len(prefix):]
+                stripped = True
+
+    path = AMP_PATH.sub('', parts.path) or '/'
+    path = path.rstrip('/') or '/'
+
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS]
+    return urlunsplit(('https', host, path, urlencode(sorted(query)), ''))
+
+def init_canonical(conn):
+    c = conn.cursor()
+    # canonical_link lets both harvesters spot the same article under a different id.
+    # The column and its index are part of the db.py schema; backfill anything harvested before it existed
+    c.execute("SELECT id, link FROM stories WHERE canonical_link IS NULL")
+    c.executemany("UPDATE stories SET canonical_link = ? WHERE id = ?",
+                  [(canonicalize_url(link), s_id) for s_id, link in c.fetchall()])
+    conn.commit()
+
+def get_known_links(c, links):
+    """Returns the canonical links out of `links` that are already in stories (one indexed IN query)."""
+    if not links: return set()
+    c.execute(f"SELECT canonical_link FROM stories WHERE canonical_link IN ({','.join('?' * len(links))})",
+              list(links))
+    return {r[0] for r in c.fetchall()}
@@ -1,68 +1,28 @@
-import sqlite3
 import os
-from urllib.parse import urlparse
+import sys
 from openai import OpenAI
 from dotenv import load_dotenv
 from datetime import datetime
+from llm_cache import cached_completion
+from batch_jobs import init_batch_tables
+from scheduler import run_prioritized, get_deadline, bounded_client
+from db import get_conn, get_unprepped_stories, save_script
 
 # --- CONFIGURATION ---
 load_dotenv(dotenv_path="env.txt")
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY").strip())
+PROMPT_VERSION = 'celeb-prep-v1'  # Bump when the gossip prompt changes so cached scripts are ignored
 
 def init_script_table():
-    conn = sqlite3.connect('magic_rundown.db')
-    c = conn.cursor()
-    
-    # 1. Ensure the table exists
-    c.execute('''CREATE TABLE IF NOT EXISTS radio_scripts
-                 (id TEXT PRIMARY KEY, tease TEXT, full_story TEXT, 
-                  source_name TEXT, link TEXT, timestamp DATETIME)''')
-    
-    # 2. MIGRATION: Add category column to scripts table if missing
-    try:
-        c.execute("ALTER TABLE radio_scripts ADD COLUMN category TEXT DEFAULT 'news'")
-        print("🛠 Database Migrated: Added 'category' column to radio_scripts.")
-    except sqlite3.OperationalError:
-        pass # Already exists
-        
-    conn.commit()
+    # radio_scripts itself comes from db.migrate(); the batch tables say which stories autopilot.py --batch already sent
+    conn = get_conn()
+    init_batch_tables(conn)
     return conn
 
-def run_celeb_autopilot():
-    conn = init_script_table()
-    c = conn.cursor()
-    
-    today = datetime.now().strftime('%Y-%m-%d')
-    
-    # Grab Celeb stories scored 7-10 for today
-    c.execute("""
-        SELECT id, title, summary, link, score 
-        FROM selected_stories 
-        WHERE score >= 7 AND date(timestamp) = ? AND category = 'celeb'
-        ORDER BY score DESC
-    """, (today,))
-    
-    stories_to_prep = c.fetchall()
-    
-    if not stories_to_prep:
-        print(f"📭 No Celeb stories (Score 7+) found for {today}.")
-        return
-
-    print(f"🚀 CELEB AUTOPILOT: Prepping {len(stories_to_prep)} gossip stories...")
-    print("-" * 50)
-
-    for s_id, title, summary, link, score in stories_to_prep:
-        # Check if already prepped
-        c.execute("SELECT id FROM radio_scripts WHERE id = ?", (s_id,))
-        if c.fetchone():
-            continue
-
-        print(f"✍️ Writing ({score}/10): {title[:50]}...", end=" ", flush=True)
-
-        domain = urlparse(link).netloc.replace('www.', '')
-        
-        # THE CELEB-SPECIFIC GOSSIP PROMPT
-        prompt = f"""
+def write_celeb_prep(title, summary, llm_client=client):
+    """Writes one gossip segment. Returns (tease, story), or (None, None) if the AI call fails."""
+    # THE CELEB-SPECIFIC GOSSIP PROMPT
+    prompt = f"""
         Act as a dishy entertainment reporter for Magic 96.7. 
         Write a celebrity news segment for our 'Hollywood Rundown' section.
 
@@ -82,27 +42,59 @@ def run_celeb_autopilot():
         FULL STORY: [The Dish, all details, funny, interesting]
         """
 
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.4  # Slightly higher for more "flavor" than hard news
-            )
-            raw = response.choices[0].message.content
-            
-            if "TEASE:" in raw and "FULL STORY:" in raw:
-                tease = raw.split("TEASE:")[1].split("FULL STORY:")[0].strip()
-                story = raw.split("FULL STORY:")[1].strip()
-            else:
-                tease = "Hollywood is buzzing..."
-                story = raw
+    try:
+        raw = cached_completion(
+            llm_client, PROMPT_VERSION,
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.4  # Slightly higher for more "flavor" than hard news
+        )
+    except Exception as e:
+        print(f"\n   ⚠️ {title[:40]}: {e}")
+        return None, None
+    
+    if "TEASE:" in raw and "FULL STORY:" in raw:
+        tease = raw.split("TEASE:")[1].split("FULL STORY:")[0].strip()
+        story = raw.split("FULL STORY:")[1].strip()
+    else:
+        tease = "Hollywood is buzzing..."
+        story = raw
+    return tease, story
+
+def run_celeb_autopilot(deadline=None):
+    """Preps today's 7+ celeb stories a few at a time, best score first then freshest.
+
+    Anything not started by `deadline` stays queued for the next run.
+    """
+    conn = init_script_table()
+    
+    today = datetime.now().strftime('%Y-%m-%d')
+    
+    # Grab un-prepped Celeb stories scored 7-10 for today
+    stories_to_prep = get_unprepped_stories(conn, 7, category='celeb', date=today, skip_batched=True)
+    
+    if not stories_to_prep:
+        print(f"📭 No Celeb stories (Score 7+) found for {today}.")
+        return
+
+    print(f"🚀 CELEB AUTOPILOT: Prepping {len(stories_to_prep)} gossip stories..."
+          + (f" (deadline {deadline.strftime('%H:%M')})" if deadline else ""))
+    print("-" * 50)
 
+    finished = 0
+    for (s_id, title, summary, link, ts, cat, score), result in run_prioritized(
+            stories_to_prep, lambda item: write_celeb_prep(item[1], item[2], bounded_client(client, deadline)),
+            deadline=deadline):
+        finished += 1
+        tease, story = result or (None, None)
+        print(f"✍️ Writing ({score}/10): {title[:50]}...", end=" ", flush=True)
+        if not (tease and story):
+            print("FAILED.")
+            continue
+
+        try:
             # Store with the 'celeb' category tag
-            c.execute("""
-                INSERT OR REPLACE INTO radio_scripts 
-                (id, tease, full_story, source_name, link, timestamp, category) 
-                VALUES (?, ?, ?, ?, ?, datetime('now'), ?)
-            """, (s_id, tease, story, domain, link, 'celeb'))
+            save_script(conn, s_id, tease, story, link, category='celeb')
             
             conn.commit()
             print("DONE.")
@@ -110,9 +102,11 @@ def run_celeb_autopilot():
         except Exception as e:
             print(f"FAILED: {e}")
 
-    conn.close()
+    if finished < len(stories_to_prep):
+        print(f"⏰ Deadline reached: {len(stories_to_prep) - finished} stories left queued for the next run.")
+
     print("-" * 50)
     print("✅ Celeb Autopilot Complete.")
 
 if __name__ == "__main__":
-    run_celeb_autopilot()
\ No newline at end of file
+    run_celeb_autopilot(deadline=get_deadline(sys.argv))
\ No newline at end of file
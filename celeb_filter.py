@@ -1,112 +1,169 @@
-import sqlite3
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import asyncio
+import json
 from datetime import datetime
-
-load_dotenv(dotenv_path="env.txt")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY").strip())
+from dedupe import init_dedupe, assign_cluster
+from llm import AsyncLLM
+from rules import load_rules, init_rule_hits, save_rule_hits
+from batch_jobs import init_batch_tables
+from extractor import init_extract_queue
+from db import get_conn, get_unscored_stories, save_score
 
 def init_winners():
-    conn = sqlite3.connect('magic_rundown.db')
-    c = conn.cursor()
-    
-    # 1. Ensure the table exists
-    c.execute('''CREATE TABLE IF NOT EXISTS selected_stories
-                 (id TEXT PRIMARY KEY, title TEXT, score INTEGER, 
-                  summary TEXT, link TEXT, timestamp DATETIME)''')
-    
-    # 2. MIGRATION: Add category column if it is missing
-    try:
-        c.execute("ALTER TABLE selected_stories ADD COLUMN category TEXT DEFAULT 'news'")
-        print("🛠 Database Migrated: Added 'category' column.")
-    except sqlite3.OperationalError:
-        pass
-        
-    conn.commit()
+    conn = get_conn()
+    init_dedupe(conn)
+    init_rule_hits(conn)
+    init_batch_tables(conn)
+    init_extract_queue(conn)
     return conn
 
+# The "Elite Trash" rubric, shared by single and batch scoring
+GOSSIP_RUBRIC = (
+    "Rank this celebrity story 1-10 for a dishy morning radio segment (Moms 35-54). "
+    "10: This is either:"
+    "A) ELITE TRASH (Scandals, major breakups, A-list feuds, shocking reveals, 'wild' behavior). "
+    "Or B) Major/Interesting ENT NEWS (Massive casting like James Bond/Marvel, a beloved show finale, "
+    "huge award wins, or a trailer for a giant franchise). "
+    "8-9: Actors/Musician news"
+    "7-8: Standard (Movie trailers, award announcements, harmless A-list updates). "
+    "1: AUTOMATIC REJECT (Shopping deals, product endorsements, 'Everything to know' guides, politics NOT celeb related,"
+    "lookalike stories, or anything about 'discounts'). "
+    "We want drama, not a shopping catalog."
+    "Subtract 4 from a score if it's a recipe."
+    "Be extremely critical and harsh; be stingy with 10/10s."
+)
+
+BATCH_SIZE = 20  # Titles per request; titles are short so batches can be bigger than filter.py's
+PROMPT_VERSION = 'gossip-v1'  # Bump when the rubric changes so cached scores are ignored
+
+def parse_celeb_score(content):
+    try:
+        score = int(''.join(filter(str.isdigit, content.strip())))
+    except (ValueError, AttributeError):
+        return None
+    return score if 1 <= score <= 10 else None
+
+def parse_celeb_scores(content):
+    try:
+        scores = json.loads(content).get('scores', {})
+    except (ValueError, AttributeError):
+        return {}
+    return scores if isinstance(scores, dict) else {}
+
+async def score_celeb(llm, title):
+    """Single-title gossip score. Returns None if the AI call fails."""
+    try:
+        content = await llm.complete(
+            PROMPT_VERSION,
+            validate=lambda reply: parse_celeb_score(reply) is not None,
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": GOSSIP_RUBRIC + "Return ONLY the number." + f"\nSTORY: {title}"}],
+            max_tokens=2, 
+            temperature=0.2
+        )
+        return parse_celeb_score(content)
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
+
+async def score_celeb_batch(llm, stories):
+    """Scores a list of (s_id, title) in one request. Returns {s_id: score or None}; missing ones get a single call."""
+    numbered = {str(i): story for i, story in enumerate(stories, 1)}
+    story_block = "\n".join(f"{key}. {title}" for key, (s_id, title) in numbered.items())
+
+    scores = {}
+    try:
+        content = await llm.complete(
+            PROMPT_VERSION,
+            validate=lambda reply: bool(parse_celeb_scores(reply)),
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": GOSSIP_RUBRIC
+                       + "Score EVERY story below on its own. "
+                       + 'Return ONLY JSON shaped like {"scores": {"1": 7, "2": 3}} using the story numbers as keys.'
+                       + f"\nSTORIES:\n{story_block}"}],
+            response_format={"type": "json_object"},
+            temperature=0.2
+        )
+        scores = parse_celeb_scores(content)
+    except Exception as e:
+        print(f"⚠️ Batch scoring failed ({e}), falling back to single calls")
+
+    results, missing = {}, []
+    for key, (s_id, title) in numbered.items():
+        try:
+            score = int(scores[key])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            score = None
+        if score is not None and 1 <= score <= 10:
+            results[s_id] = score
+        else:
+            missing.append((s_id, title))
+
+    retried = await llm.map(lambda story: score_celeb(llm, story[1]), missing)
+    results.update((s_id, score) for (s_id, _), score in zip(missing, retried))
+    return results
+
+async def score_all(batches):
+    """Scores every batch concurrently under the shared rate limits."""
+    async with AsyncLLM() as llm:
+        return await llm.map(
+            lambda batch: score_celeb_batch(llm, [(s_id, title) for s_id, title, _, _, _ in batch]),
+            batches)
+
 def run_celeb_filter():
     conn = init_winners()
     c = conn.cursor()
     
     # Only select stories tagged as 'celeb' that haven't been scored yet
-    query = """
-        SELECT id, title, summary, link, timestamp FROM stories 
-        WHERE category = 'celeb' AND id NOT IN (SELECT id FROM selected_stories)
-        ORDER BY timestamp DESC
-    """
-    c.execute(query)
-    raw_stories = c.fetchall()
+    # (or sent to an overnight batch by filter.py --batch; that answer is already paid for)
+    raw_stories = get_unscored_stories(conn, 'celeb', newest_first=True, skip_batched=True)
     
     if not raw_stories:
         print("\n☕️ NO NEW CELEB STORIES: Everything is already scored.")
         return
 
     # --- THE HARD REJECT LIST ---
-    # Skips these before spending any AI credits
-    BANNED_PHRASES = [
-        "everything to know", "lookalikes", "swears by", "face mist", 
-        "deal", "discount", "sale", "where to buy", "shop the", 
-        "must-have", "gift guide", "skincare routine", "amazon", "walmart",
-        "double take", "designer lookalikes", "swears this"
-    ]
+    # Lives in rules.json now and mostly fires at harvest time; this catches anything
+    # stored before a rule was added. Skips these before spending any AI credits.
+    rule_engine = load_rules()
 
     print(f"\n💎 AI GOSSIP SCORING: {len(raw_stories)} candidate stories found.")
     print("-" * 50)
 
+    to_score = []
     for s_id, title, summary, link, timestamp in raw_stories:
         
-        # 1. PRE-FILTER: Check against banned phrases
-        if any(phrase in title.lower() for phrase in BANNED_PHRASES):
+        # 1. PRE-FILTER: Check against the reject rules
+        if rule_engine.match(title, link, 'celeb'):
             print(f"⏩ Skipping SEO-Bait/Shopping: {title[:50]}...")
             continue
 
-        # 2. AI SCORING: The "Elite Trash" Prompt
-        prompt = (
-            "Rank this celebrity story 1-10 for a dishy morning radio segment (Moms 35-54). "
-            "10: This is either:"
-            "A) ELITE TRASH (Scandals, major breakups, A-list feuds, shocking reveals, 'wild' behavior). "
-            "Or B) Major/Interesting ENT NEWS (Massive casting like James Bond/Marvel, a beloved show finale, "
-            "huge award wins, or a trailer for a giant franchise). "
-            "8-9: Actors/Musician news"
-            "7-8: Standard (Movie trailers, award announcements, harmless A-list updates). "
-            "1: AUTOMATIC REJECT (Shopping deals, product endorsements, 'Everything to know' guides, politics NOT celeb related,"
-            "lookalike stories, or anything about 'discounts'). "
-            "We want drama, not a shopping catalog."
-            "Subtract 4 from a score if it's a recipe."
-            "Be extremely critical and harsh; be stingy with 10/10s."
-            "Return ONLY the number."
-        )
+        # Same story already picked up from another gossip feed
+        if assign_cluster(c, s_id, title, summary) != s_id:
+            conn.commit()
+            print(f"⏩ Skipping Duplicate: {title[:50]}...")
+            continue
 
-        try:
+        to_score.append((s_id, title, summary, link, timestamp))
+    save_rule_hits(conn, rule_engine)
+
+    # 2. AI SCORING: The "Elite Trash" rubric, many titles per request, batches in parallel
+    batches = [to_score[i:i + BATCH_SIZE] for i in range(0, len(to_score), BATCH_SIZE)]
+    results = asyncio.run(score_all(batches)) if batches else []
+
+    for batch, scores in zip(batches, results):
+        for s_id, title, summary, link, timestamp in batch:
+            score = scores[s_id]
             print(f"🧐 Gossip Score: {title[:60]}...", end=" ", flush=True)
-            
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt + f"\nSTORY: {title}"}],
-                max_tokens=2, 
-                temperature=0.2
-            )
-            
-            score_text = response.choices[0].message.content.strip()
-            score = int(''.join(filter(str.isdigit, score_text)))
-            
+            if score is None:
+                # Left unscored so the next run tries again
+                print("FAILED")
+                continue
             print(f"Result: {score}/10")
             
             # 3. SAVE: Includes the 'celeb' category tag for the tabbed dashboard
-            c.execute("""
-                INSERT OR REPLACE INTO selected_stories 
-                (id, title, score, summary, link, timestamp, category) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (s_id, title, score, summary, link, timestamp, 'celeb'))
-            conn.commit()
-            
-        except Exception as e:
-            print(f"Error: {e}")
-            continue
+            save_score(conn, s_id, title, score, summary, link, timestamp, 'celeb')
+        conn.commit()
 
-    conn.close()
     print("-" * 50)
     print("✅ CELEB SCORING COMPLETE.")
 if __name__ == "__main__":
@@ -1,11 +1,15 @@
 import feedparser
-import sqlite3
 import urllib.request
+import urllib.error
 import ssl
 import time
-import trafilatura
 import re
 from datetime import datetime, timedelta
+from feed_fetcher import poll_feeds, get_domain, init_feed_state, load_feed_state, save_feed_state
+from extractor import init_extract_queue, queue_extractions, run_extraction
+from canonical import canonicalize_url, init_canonical, get_known_links
+from rules import load_rules, init_rule_hits, save_rule_hits
+from db import get_conn, get_known_ids, insert_stories
 
 # --- CELEB & GOSSIP FEEDS ---
 CELEB_FEEDS = [
@@ -25,16 +29,11 @@ CELEB_FEEDS = [
     'https://nypost.com/rssfeeds/'
 ]
 def init_db():
-    conn = sqlite3.connect('magic_rundown.db')
-    c = conn.cursor()
-    # Migration: Ensure table has 7 columns for the 'category' tag
-    try:
-        c.execute("ALTER TABLE stories ADD COLUMN category TEXT DEFAULT 'news'")
-    except:
-        pass 
-    c.execute('''CREATE TABLE IF NOT EXISTS stories
-                 (id TEXT PRIMARY KEY, title TEXT, summary TEXT, link TEXT, timestamp DATETIME, raw_date TEXT, category TEXT)''')
-    conn.commit()
+    conn = get_conn()
+    init_feed_state(conn)
+    init_extract_queue(conn)
+    init_canonical(conn)
+    init_rule_hits(conn)
     return conn
 
 def extract_reddit_target_url(entry):
@@ -47,14 +46,6 @@ def extract_reddit_target_url(entry):
             return l
     return entry.link
 
-def get_full_article_text(url):
-    try:
-        downloaded = trafilatura.fetch_url(url)
-        content = trafilatura.extract(downloaded, include_comments=False, include_tables=False)
-        return content if content else ""
-    except:
-        return ""
-
 def harvest_celeb():
     conn = init_db()
     c = conn.cursor()
@@ -63,26 +54,45 @@ def harvest_celeb():
     cutoff = now - timedelta(days=2) 
     
     total_added = 0
+    total_blocked = 0
+    # Hard-reject rules run before anything is stored or queued for extraction
+    rule_engine = load_rules()
     print(f"\n✨ STARTING CELEB HARVEST: {now.strftime('%H:%M:%S')}")
     print("-" * 65)
     
-    for url in CELEB_FEEDS:
-        domain = url.split('/')[2].replace('www.', '')
+    def fetch_feed(url, conditional_headers):
+        headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'}
+        headers.update(conditional_headers)
+        req = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(req, context=ssl_context, timeout=15) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            # urllib treats 304 Not Modified as an error
+            if e.code == 304: return 304, b'', e.headers
+            raise
+
+    # All feeds download in parallel; each one is processed as soon as it lands
+    for url, result, error in poll_feeds(CELEB_FEEDS, fetch_feed, load_feed_state(conn)):
+        domain = get_domain(url)
         print(f"📸 Checking {domain:.<30}", end=" ", flush=True)
         
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'}
-            req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, context=ssl_context, timeout=15) as response:
-                feed_data = response.read()
-            feed = feedparser.parse(feed_data)
+            if error: raise error
+            if result.unchanged:
+                # 304 or byte-for-byte the same feed as last run: nothing to parse
+                save_feed_state(conn, url, result)
+                conn.commit()
+                print("UNCHANGED")
+                continue
+            feed = feedparser.parse(result.body)
         except Exception:
             print("FAILED (Network)")
             continue
             
-        feed_added = 0
+        candidates = []
+        feed_blocked = 0
         for entry in feed.entries:
-            title = entry.title
             real_news_link = extract_reddit_target_url(entry)
             s_id = entry.get('id', real_news_link)
             
@@ -94,32 +104,53 @@ def harvest_celeb():
             
             if pub_date > now: pub_date = now 
             if pub_date < cutoff: continue
+            if rule_engine.match(entry.get('title', ''), real_news_link, 'celeb'):
+                feed_blocked += 1
+                continue
+            candidates.append((s_id, entry, real_news_link, pub_date))
 
-            # Check if exists
-            c.execute("SELECT id FROM stories WHERE id = ?", (s_id,))
-            if c.fetchone(): continue
+        # Check which ones already exist in a single query
+        # Same article under another id (tracking params, AMP, mobile host) counts as known too
+        canonical_links = {cand[0]: canonicalize_url(cand[2]) for cand in candidates}
+        known_ids = get_known_ids(conn, set(canonical_links))
+        known_links = get_known_links(c, set(canonical_links.values()))
+        new_rows, new_jobs = [], []
+        for s_id, entry, real_news_link, pub_date in candidates:
+            canonical_link = canonical_links[s_id]
+            if s_id in known_ids or canonical_link in known_links: continue
+            known_ids.add(s_id)
+            known_links.add(canonical_link)
 
             print(f".", end="", flush=True) 
-            full_text = get_full_article_text(real_news_link)
-            final_content = full_text if (full_text and len(full_text) > 150) else entry.get('summary', '')
 
             try:
                 # IMPORTANT: category='celeb' is added here
-                c.execute("INSERT OR REPLACE INTO stories VALUES (?, ?, ?, ?, ?, ?, ?)",
-                          (s_id, title, final_content, real_news_link, 
-                           pub_date.strftime('%Y-%m-%d %H:%M:%S'), 
-                           pub_date.strftime('%Y-%m-%d'), 'celeb'))
-                feed_added += 1
+                # Feed summary goes in now; the extraction stage upgrades it to the full article
+                new_rows.append((s_id, entry.title, entry.get('summary', ''), real_news_link, 
+                                 pub_date.strftime('%Y-%m-%d %H:%M:%S'), 
+                                 pub_date.strftime('%Y-%m-%d'), 'celeb', canonical_link))
+                new_jobs.append((s_id, real_news_link))
             except Exception as e: 
                 continue
-        
+
+        # One short write transaction per feed
+        insert_stories(conn, new_rows)
+        queue_extractions(c, new_jobs)
+        save_feed_state(conn, url, result)
+        conn.commit()
+
+        feed_added = len(new_rows)
         total_added += feed_added
-        print(f" Added {feed_added}")
+        total_blocked += feed_blocked
+        print(f" Added {feed_added}" + (f" (blocked {feed_blocked})" if feed_blocked else ""))
     
+    save_rule_hits(conn, rule_engine)
     conn.commit()
-    conn.close()
     print("-" * 65)
-    print(f"✅ CELEB HARVEST COMPLETE: {total_added} stories added.")
+    if total_blocked:
+        print(f"🚫 {total_blocked} stories blocked by rules.json before extraction.")
+    print(f"✅ CELEB HARVEST COMPLETE: {total_added} stories added in {(datetime.now() - now).seconds}s.")
 
 if __name__ == "__main__":
-    harvest_celeb()
\ No newline at end of file
+    harvest_celeb()
+    run_extraction()
\ No newline at end of file
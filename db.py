@@ -0,0 +1,322 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from urllib.parse import urlparse
+
+# --- CONFIGURATION ---
+DB_PATH = 'magic_rundown.db'
+HIGH_SCORE = 8            # Counted as a "high" story in daily_rollup (the autopilot's cut-off)
+BUSY_TIMEOUT_MS = 30000   # Wait this long for another script's write instead of "database is locked"
+CACHED_STATEMENTS = 256   # Prepared statements kept per connection; every query below stays compiled
+
+_local = threading.local()
+
+# --- SCHEMA ---
+# The core tables, defined once. Since migration 5 the summary columns stay NULL: article text
+# lives once, compressed, in article_bodies and stories/selected_stories point at it by body_hash. Side tables owned by one module (feed_state, extract_queue,
+# story_fingerprints, rule_hits, llm_batches) are still created by that module's init_* helper.
+STORIES = """id TEXT PRIMARY KEY, title TEXT, summary TEXT, link TEXT, timestamp DATETIME,
+             raw_date TEXT, category TEXT DEFAULT 'general', canonical_link TEXT"""
+SELECTED_STORIES = """id TEXT PRIMARY KEY, title TEXT, score INTEGER, summary TEXT, link TEXT,
+                      timestamp DATETIME, category TEXT DEFAULT 'general', scored_by TEXT"""
+RADIO_SCRIPTS = """id TEXT PRIMARY KEY, tease TEXT, full_story TEXT, source_name TEXT, link TEXT,
+                   timestamp DATETIME, is_aired INTEGER DEFAULT 0, category TEXT DEFAULT 'general'"""
+
+def rebuild_table(conn, name, columns):
+    """Creates `name` with exactly `columns`, carrying over the rows (and whichever columns an older copy had)."""
+    existing = [r[1] for r in conn.execute(f"PRAGMA table_info({name})")]
+    if not existing:
+        conn.execute(f"CREATE TABLE {name} ({columns})")
+        return
+    conn.execute(f"CREATE TABLE {name}_new ({columns})")
+    shared = ', '.join(r[1] for r in conn.execute(f"PRAGMA table_info({name}_new)") if r[1] in existing)
+    conn.execute(f"INSERT INTO {name}_new ({shared}) SELECT {shared} FROM {name}")
+    conn.execute(f"DROP TABLE {name}")
+    conn.execute(f"ALTER TABLE {name}_new RENAME TO {name}")
+
+def migration_1(conn):
+    # Every script used to create these tables its own way ('news' vs 'general' defaults, 6 vs 8 columns)
+    rebuild_table(conn, 'stories', STORIES)
+    rebuild_table(conn, 'selected_stories', SELECTED_STORIES)
+    rebuild_table(conn, 'radio_scripts', RADIO_SCRIPTS)
+    for table in ('stories', 'selected_stories', 'radio_scripts'):
+        conn.execute(f"UPDATE {table} SET category = 'general' WHERE category IS NULL OR category = 'news'")
+    conn.execute("UPDATE radio_scripts SET is_aired = 0 WHERE is_aired IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stories_canonical_link ON stories(canonical_link)")
+
+def migration_2(conn):
+    # date(timestamp) can't use an index; a stored date column can
+    conn.execute("ALTER TABLE selected_stories ADD COLUMN story_date TEXT")
+    conn.execute("UPDATE selected_stories SET story_date = date(timestamp)")
+    conn.execute("CREATE INDEX idx_selected_category_date_score ON selected_stories(category, story_date, score)")
+    conn.execute("CREATE INDEX idx_selected_story_date ON selected_stories(story_date)")
+    conn.execute("CREATE INDEX idx_radio_scripts_is_aired ON radio_scripts(is_aired)")
+
+# scored, high, prepped, aired over selected_stories s LEFT JOIN radio_scripts r
+ROLLUP_COUNTS = f"COUNT(*), COALESCE(SUM(s.score >= {HIGH_SCORE}), 0), COUNT(r.id), COALESCE(SUM(r.is_aired), 0)"
+
+def migration_3(conn):
+    # Per-day counts for the date picker, kept current by refresh_rollup() instead of scanning every story
+    conn.execute("""CREATE TABLE daily_rollup
+                    (story_date TEXT, category TEXT, scored INTEGER, high INTEGER, prepped INTEGER, aired INTEGER,
+                     PRIMARY KEY (story_date, category))""")
+    conn.execute(f"""
+        INSERT INTO daily_rollup (story_date, category, scored, high, prepped, aired)
+        SELECT s.story_date, s.category, {ROLLUP_COUNTS}
+        FROM selected_stories s LEFT JOIN radio_scripts r ON r.id = s.id
+        WHERE s.story_date IS NOT NULL
+        GROUP BY s.story_date, s.category
+    """)
+
+def migration_4(conn):
+    # Every write to the dashboard's tables leaves the story id here, whichever script made it,
+    # so an open dashboard can pick up just those rows
+    conn.execute("""CREATE TABLE change_log
+                    (seq INTEGER PRIMARY KEY AUTOINCREMENT, row_id TEXT, changed_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+    for table in ('selected_stories', 'radio_scripts'):
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            conn.execute(f"""
+                CREATE TRIGGER log_{table}_{event.lower()} AFTER {event} ON {table}
+                BEGIN INSERT INTO change_log (row_id) VALUES ({row}.id); END
+            """)
+
+BODY_TABLES = ('stories', 'selected_stories')
+
+def migration_5(conn):
+    # Article text was stored twice (stories + selected_stories), uncompressed, next to the list columns
+    conn.execute("CREATE TABLE article_bodies (hash TEXT PRIMARY KEY, body BLOB, size INTEGER)")
+    for table in BODY_TABLES:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN body_hash TEXT")
+        rows = conn.execute(f"SELECT id, summary FROM {table} WHERE summary IS NOT NULL").fetchall()
+        hashes = put_bodies(conn, [summary for _, summary in rows])
+        conn.executemany(f"UPDATE {table} SET body_hash = ?, summary = NULL WHERE id = ?",
+                         [(body_hash, s_id) for body_hash, (s_id, _) in zip(hashes, rows)])
+        conn.execute(f"CREATE INDEX idx_{table}_body_hash ON {table}(body_hash)")
+
+# Append only; PRAGMA user_version records how many have run
+MIGRATIONS = [migration_1, migration_2, migration_3, migration_4, migration_5]
+
+def migrate(conn):
+    """Brings the file up to the latest schema. Safe to call from every script at once."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS): return
+    # IMMEDIATE takes the write lock first, so two scripts starting together can't both migrate
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            print(f"🛠 Database Migrated: schema version {number}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def open_connection(path, **kwargs):
+    """New connection in WAL mode: readers never wait on a writer, and the writer doesn't wait on readers."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=CACHED_STATEMENTS, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Safe in WAL mode; only skips the fsync on every commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    # Lets queries read article_bodies.body as text: body_text(b.body)
+    conn.create_function('body_text', 1, unpack_body, deterministic=True)
+    return conn
+
+def get_conn(path=DB_PATH):
+    """The connection for this process and thread, opened on first use and reused after that."""
+    # Extraction workers are forked; never share the parent's connection with them
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.pid, _local.conns = os.getpid(), {}
+    if path not in _local.conns:
+        _local.conns[path] = open_connection(path)
+        migrate(_local.conns[path])
+    return _local.conns[path]
+
+def in_clause(values):
+    return ','.join('?' * len(values))
+
+# --- ARTICLE BODIES ---
+def unpack_body(blob):
+    return zlib.decompress(blob).decode('utf-8') if blob is not None else None
+
+def put_bodies(conn, texts):
+    """Stores each text once, zlib-compressed under its SHA-1. Returns the hashes (None for None)."""
+    hashes = [hashlib.sha1(text.encode('utf-8')).hexdigest() if text is not None else None for text in texts]
+    conn.executemany("INSERT OR IGNORE INTO article_bodies (hash, body, size) VALUES (?, ?, ?)",
+                     [(h, zlib.compress(text.encode('utf-8')), len(text))
+                      for h, text in {h: t for h, t in zip(hashes, texts) if h}.items()])
+    return hashes
+
+def delete_orphan_bodies(conn):
+    """Drops bodies no story points at any more (replaced feed summaries, archived stories). Returns rows removed."""
+    return conn.execute(f"""
+        DELETE FROM article_bodies WHERE
+        {' AND '.join(f"hash NOT IN (SELECT body_hash FROM {table} WHERE body_hash IS NOT NULL)" for table in BODY_TABLES)}
+    """).rowcount
+
+# --- STORIES (harvested) ---
+def get_known_ids(conn, ids):
+    """Returns the ids out of `ids` already in stories (one IN query instead of a SELECT per entry)."""
+    if not ids: return set()
+    rows = conn.execute(f"SELECT id FROM stories WHERE id IN ({in_clause(ids)})", list(ids))
+    return {r[0] for r in rows}
+
+def insert_stories(conn, rows):
+    """rows: (id, title, summary, link, timestamp, raw_date, category, canonical_link)"""
+    hashes = put_bodies(conn, [row[2] for row in rows])
+    conn.executemany("""
+        INSERT OR REPLACE INTO stories
+        (id, title, body_hash, link, timestamp, raw_date, category, canonical_link)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [row[:2] + (body_hash,) + row[3:] for row, body_hash in zip(rows, hashes)])
+
+def set_story_summary(conn, s_id, summary):
+    body_hash = put_bodies(conn, [summary])[0]
+    # A re-extraction can land after scoring; the dashboard reads the selected copy
+    for table in BODY_TABLES:
+        conn.execute(f"UPDATE {table} SET body_hash = ? WHERE id = ?", (body_hash, s_id))
+
+def get_story(conn, s_id):
+    """(title, summary, link, timestamp, category) or None."""
+    return conn.execute("""
+        SELECT title, body_text(b.body), link, timestamp, category
+        FROM stories LEFT JOIN article_bodies b ON b.hash = body_hash WHERE id = ?
+    """, (s_id,)).fetchone()
+
+def get_unscored_stories(conn, category, newest_first=False, skip_batched=False):
+    """[(id, title, summary, link, timestamp)] not yet scored, leaving out known near-duplicates.
+
+    Stories still waiting for their first full-text extraction are held back so they aren't scored on
+    the feed summary; ones whose extraction keeps failing come through with the summary after that.
+    """
+    return conn.execute(f"""
+        SELECT id, title, body_text(b.body), link, timestamp
+        FROM stories LEFT JOIN article_bodies b ON b.hash = body_hash
+        WHERE category = ? AND id NOT IN (SELECT id FROM selected_stories)
+        AND id NOT IN (SELECT id FROM story_fingerprints WHERE cluster_id != id)
+        AND id NOT IN (SELECT id FROM extract_queue WHERE attempts = 0)
+        {"AND id NOT IN (SELECT story_id FROM llm_batch_items WHERE kind = 'score')" if skip_batched else ""}
+        ORDER BY timestamp {"DESC" if newest_first else ""}
+    """, (category,)).fetchall()
+
+# --- SELECTED STORIES (scored) ---
+def save_score(conn, s_id, title, score, summary, link, timestamp, category, scored_by=None):
+    before = get_rollup_key(conn, s_id)
+    # Same text as the harvested story, so this only adds a reference to its existing body
+    body_hash = put_bodies(conn, [summary])[0]
+    # Use the original harvest 'timestamp' to prevent Date Bleed
+    conn.execute("""
+        INSERT OR REPLACE INTO selected_stories
+        (id, title, score, body_hash, link, timestamp, category, scored_by, story_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, date(?))
+    """, (s_id, title, score, body_hash, link, timestamp, category, scored_by, timestamp))
+    refresh_rollup(conn, before, get_rollup_key(conn, s_id))
+
+def get_selected_story(conn, s_id):
+    """(title, summary, link, timestamp, category, score) or None."""
+    return conn.execute("""
+        SELECT title, body_text(b.body), link, timestamp, category, score
+        FROM selected_stories LEFT JOIN article_bodies b ON b.hash = body_hash WHERE id = ?
+    """, (s_id,)).fetchone()
+
+def get_unprepped_stories(conn, min_score, category=None, date=None, limit=None, skip_batched=False):
+    """[(id, title, summary, link, timestamp, category, score)] without a script, best score then freshest first."""
+    where, params = ["score >= ?", "id NOT IN (SELECT id FROM radio_scripts)"], [min_score]
+    if category:
+        where.append("category = ?")
+        params.append(category)
+    if date:
+        where.append("story_date = ?")
+        params.append(date)
+    if skip_batched:
+        where.append("id NOT IN (SELECT story_id FROM llm_batch_items WHERE kind = 'prep')")
+    return conn.execute(f"""
+        SELECT id, title, body_text(b.body), link, timestamp, category, score
+        FROM selected_stories LEFT JOIN article_bodies b ON b.hash = body_hash
+        WHERE {' AND '.join(where)}
+        ORDER BY score DESC, timestamp DESC
+        {"LIMIT ?" if limit else ""}
+    """, params + ([limit] if limit else [])).fetchall()
+
+def get_story_list(conn, date, category, ids=None):
+    """[(id, title, score, is_prepped, is_aired)] for one dashboard tab, best first. ids= limits it to those stories.
+
+    Only the columns a list card shows; bodies and scripts are fetched per story when opened.
+    """
+    ids = list(ids) if ids is not None else None
+    return conn.execute(f"""
+        SELECT s.id, s.title, s.score, r.id IS NOT NULL, COALESCE(r.is_aired, 0)
+        FROM selected_stories s LEFT JOIN radio_scripts r ON r.id = s.id
+        WHERE s.category = ? AND s.story_date = ? {f"AND s.id IN ({in_clause(ids)})" if ids is not None else ""}
+        ORDER BY s.score DESC
+    """, [category, date] + (ids or [])).fetchall()
+
+def get_training_rows(conn):
+    """[(title, summary, category, score)] scored by the LLM, never by the triage model itself."""
+    return conn.execute("""
+        SELECT title, body_text(b.body), category, score
+        FROM selected_stories LEFT JOIN article_bodies b ON b.hash = body_hash
+        WHERE score IS NOT NULL AND (scored_by IS NULL OR scored_by != 'triage')
+    """).fetchall()
+
+# --- RADIO SCRIPTS ---
+def save_script(conn, s_id, tease, story, link, timestamp=None, category='general'):
+    """Stores a prep. timestamp=None stamps it with the current time."""
+    domain = urlparse(link).netloc.replace('www.', '')
+    conn.execute("""
+        INSERT OR REPLACE INTO radio_scripts
+        (id, tease, full_story, source_name, link, timestamp, is_aired, category)
+        VALUES (?, ?, ?, ?, ?, COALESCE(?, datetime('now')), 0, ?)
+    """, (s_id, tease, story, domain, link, timestamp, category))
+    refresh_rollup(conn, get_rollup_key(conn, s_id))
+
+def get_script(conn, s_id):
+    """(tease, full_story, is_aired) or None."""
+    return conn.execute("SELECT tease, full_story, is_aired FROM radio_scripts WHERE id = ?", (s_id,)).fetchone()
+
+def set_aired(conn, s_id, is_aired):
+    conn.execute("UPDATE radio_scripts SET is_aired = ? WHERE id = ?", (is_aired, s_id))
+    refresh_rollup(conn, get_rollup_key(conn, s_id))
+
+# --- DAILY ROLLUP ---
+def get_rollup_key(conn, s_id):
+    """(story_date, category) of a scored story, or None."""
+    return conn.execute("SELECT story_date, category FROM selected_stories WHERE id = ?", (s_id,)).fetchone()
+
+def refresh_rollup(conn, *keys):
+    """Recounts the daily_rollup rows for these (story_date, category) keys; one index range scan each."""
+    for story_date, category in {key for key in keys if key}:
+        conn.execute(f"""
+            INSERT OR REPLACE INTO daily_rollup (story_date, category, scored, high, prepped, aired)
+            SELECT ?, ?, {ROLLUP_COUNTS}
+            FROM selected_stories s LEFT JOIN radio_scripts r ON r.id = s.id
+            WHERE s.category = ? AND s.story_date = ?
+        """, (story_date, category, category, story_date))
+
+def get_rollup(conn):
+    """[(story_date, scored, high, prepped, aired)] per day across both tabs, newest first."""
+    return conn.execute("""
+        SELECT story_date, SUM(scored), SUM(high), SUM(prepped), SUM(aired)
+        FROM daily_rollup WHERE scored > 0 GROUP BY story_date ORDER BY story_date DESC
+    """).fetchall()
+
+# --- CHANGE LOG ---
+CHANGE_LOG_DAYS = 1   # Change rows are only needed until an open dashboard has seen them
+
+def get_data_version(conn):
+    """Changes whenever another connection commits to the file."""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def get_last_change(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+def get_changes(conn, since):
+    """(newest seq, {story ids}) written since `since`."""
+    rows = conn.execute("SELECT seq, row_id FROM change_log WHERE seq > ?", (since,)).fetchall()
+    return max((seq for seq, _ in rows), default=since), {row_id for _, row_id in rows}
+
+def prune_change_log(conn):
+    conn.execute(f"DELETE FROM change_log WHERE changed_at < datetime('now', '-{CHANGE_LOG_DAYS} days')")
@@ -0,0 +1,74 @@
+import hashlib
+import re
+from collections import Counter
+
+# --- CONFIGURATION ---
+MAX_DISTANCE = 3    # Fingerprints this many bits apart (or fewer) are the same story
+MIN_TOKENS = 30     # Too little text to fingerprint reliably; story stays on its own
+TEXT_CHARS = 3000   # Syndicated copies match long before this, and it keeps hashing cheap
+BANDS = 4           # 4 x 16-bit bands: two hashes within 3 bits always share one band exactly
+
+def init_dedupe(conn):
+    c = conn.cursor()
+    # One row per fingerprinted story. cluster_id points at the first copy we saw (the one that gets scored).
+    c.execute('''CREATE TABLE IF NOT EXISTS story_fingerprints
+                 (id TEXT PRIMARY KEY, simhash INTEGER, cluster_id TEXT,
+                  band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER, created_at DATETIME)''')
+    for i in range(BANDS):
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_fingerprints_band{i} ON story_fingerprints(band{i})")
+    conn.commit()
+
+def tokenize(text):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+def simhash(tokens):
+    """64-bit SimHash over word trigrams. Near-identical text gives near-identical bits."""
+    features = Counter(' '.join(tokens[i:i + 3]) for i in range(max(1, len(tokens) - 2)))
+    weights = [0] * 64
+    for feature, weight in features.items():
+        h = int.from_bytes(hashlib.md5(feature.encode()).digest()[:8], 'big')
+        for bit in range(64):
+            weights[bit] += weight if h >> bit & 1 else -weight
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def to_sqlite_int(h):
+    # SQLite integers are signed 64-bit
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+def get_bands(h):
+    return [h >> (16 * i) & 0xFFFF for i in range(BANDS)]
+
+def hamming(a, b):
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+def find_cluster(c, h):
+    """Looks up stories sharing a band with h and returns the cluster of the closest one, if close enough."""
+    bands = get_bands(h)
+    c.execute("""
+        SELECT simhash, cluster_id FROM story_fingerprints
+        WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?
+    """, bands)
+    best = None
+    for other, cluster_id in c.fetchall():
+        distance = hamming(h, other)
+        if distance <= MAX_DISTANCE and (best is None or distance < best[0]):
+            best = (distance, cluster_id)
+    return best[1] if best else None
+
+def assign_cluster(c, s_id, title, text):
+    """Fingerprints a story and returns the id of the story that represents its cluster.
+
+    Returns s_id itself for a brand new story, or the id of an earlier near-duplicate.
+    """
+    c.execute("SELECT cluster_id FROM story_fingerprints WHERE id = ?", (s_id,))
+    row = c.fetchone()
+    if row: return row[0]
+
+    tokens = tokenize(f"{title} {(text or '')[:TEXT_CHARS]}")
+    if len(tokens) < MIN_TOKENS: return s_id
+
+    h = simhash(tokens)
+    cluster_id = find_cluster(c, h) or s_id
+    c.execute("INSERT INTO story_fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+              (s_id, to_sqlite_int(h), cluster_id, *get_bands(h)))
+    return cluster_id
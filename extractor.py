@@ -0,0 +1,147 @@
+import os
+import sys
+import trafilatura
+import html_cache
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from db import get_conn, set_story_summary
+
+# --- CONFIGURATION ---
+EXTRACT_WORKERS = os.cpu_count() or 2   # One process per core; extraction is CPU-bound HTML parsing
+MAX_ATTEMPTS = 3                         # Give up on a link after this many empty/failed extractions
+MIN_FULL_TEXT = 150                      # Anything shorter is a paywall stub, keep the feed summary
+# Shared by live and offline extraction so a re-extract reproduces (or improves on) the original run
+EXTRACT_OPTIONS = dict(include_comments=False, include_tables=False)
+
+def init_extract_queue(conn):
+    c = conn.cursor()
+    # Links waiting for full-text extraction. Harvest inserts the feed summary and drops the link in here.
+    c.execute('''CREATE TABLE IF NOT EXISTS extract_queue
+                 (id TEXT PRIMARY KEY, link TEXT, attempts INTEGER DEFAULT 0, queued_at DATETIME)''')
+    conn.commit()
+
+def queue_extractions(c, jobs):
+    """Queues a batch of (id, link) pairs in one statement."""
+    c.executemany("INSERT OR IGNORE INTO extract_queue (id, link, queued_at) VALUES (?, ?, datetime('now'))",
+                  jobs)
+
+def extract_text(html):
+    try:
+        content = trafilatura.extract(html, **EXTRACT_OPTIONS) if html else None
+        return content if content else ""
+    except: return ""
+
+def get_full_article_text(url, refetch=False):
+    """refetch=True skips the cache, e.g. on a retry where the cached copy was a consent wall or bot check."""
+    # Every raw page is kept, even ones that extract badly, so `reextract` can have another go at them offline
+    html = None if refetch else html_cache.get(url)
+    if html is None:
+        try:
+            html = trafilatura.fetch_url(url)
+        except: return ""
+        if html: html_cache.put(url, html)
+    return extract_text(html)
+
+def extract_job(job):
+    """Runs inside a worker process: download + extract one article."""
+    s_id, link, attempts = job
+    return s_id, get_full_article_text(link, refetch=attempts > 0)
+
+def reextract_job(job):
+    """Runs inside a worker process: extract one article from the HTML cache, no network."""
+    s_id, link = job
+    return s_id, extract_text(html_cache.get(link))
+
+def run_extraction(workers=EXTRACT_WORKERS):
+    conn = get_conn()
+    init_extract_queue(conn)
+    c = conn.cursor()
+    c.execute("SELECT id, link, attempts FROM extract_queue WHERE attempts < ? ORDER BY queued_at", (MAX_ATTEMPTS,))
+    jobs = c.fetchall()
+
+    if not jobs:
+        print("✅ EXTRACTION: Nothing waiting in the queue.")
+        return
+
+    start = datetime.now()
+    upgraded = 0
+    print(f"\n📰 EXTRACTING FULL TEXT: {len(jobs)} articles on {workers} workers")
+    print("-" * 65)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(extract_job, job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                s_id, full_text = future.result()
+            except Exception:
+                continue
+
+            if full_text and len(full_text) > MIN_FULL_TEXT:
+                # Upgrade the feed summary in place with the real article
+                set_story_summary(conn, s_id, full_text)
+                c.execute("DELETE FROM extract_queue WHERE id = ?", (s_id,))
+                upgraded += 1
+                print(".", end="", flush=True)
+            else:
+                c.execute("UPDATE extract_queue SET attempts = attempts + 1 WHERE id = ?", (s_id,))
+                print("x", end="", flush=True)
+            # Commit every result so the write lock is never held for long
+            conn.commit()
+
+    # Links that keep failing just keep their feed summary
+    c.execute("DELETE FROM extract_queue WHERE attempts >= ?", (MAX_ATTEMPTS,))
+    conn.commit()
+    print()
+    print("-" * 65)
+    print(f"✅ EXTRACTION COMPLETE: {upgraded}/{len(jobs)} stories upgraded in {(datetime.now() - start).seconds}s.")
+    evict_html_cache()
+
+def evict_html_cache():
+    dropped = html_cache.evict()
+    if dropped: print(f"🗑  HTML cache: {dropped} least recently used pages dropped")
+
+def run_reextract(workers=EXTRACT_WORKERS):
+    """Regenerates story text from the cached HTML, e.g. after changing EXTRACT_OPTIONS. Fully offline."""
+    conn = get_conn()
+    cached = html_cache.cached_urls()
+    jobs = [(s_id, link) for s_id, link in conn.execute("SELECT id, link FROM stories") if link in cached]
+
+    if not jobs:
+        print("✅ RE-EXTRACTION: No cached pages for any live story.")
+        return
+
+    start = datetime.now()
+    updated = 0
+    print(f"\n♻️ RE-EXTRACTING FROM CACHE: {len(jobs)} articles on {workers} workers")
+    print("-" * 65)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(reextract_job, job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                s_id, full_text = future.result()
+            except Exception:
+                continue
+
+            # Same bar as a live run; a page that no longer extracts keeps whatever text it has
+            if full_text and len(full_text) > MIN_FULL_TEXT:
+                set_story_summary(conn, s_id, full_text)
+                conn.commit()
+                updated += 1
+                print(".", end="", flush=True)
+            else:
+                print("x", end="", flush=True)
+
+    print()
+    print("-" * 65)
+    print(f"✅ RE-EXTRACTION COMPLETE: {updated}/{len(jobs)} stories rewritten in {(datetime.now() - start).seconds}s.")
+    evict_html_cache()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if command == 'run':
+        run_extraction()
+    elif command == 'reextract':
+        run_reextract()
+    else:
+        print("Usage: python extractor.py [run | reextract]")
@@ -0,0 +1,72 @@
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- CONFIGURATION ---
+MAX_WORKERS = None   # Feeds downloaded at the same time; None = one thread per feed so nothing waits for a second wave
+PER_HOST_LIMIT = 2   # Never hit the same site (reddit, people.com...) with more than this at once
+
+# unchanged=True means the feed answered 304 or sent back the exact same body as last run
+FeedResult = namedtuple('FeedResult', 'body etag last_modified body_hash unchanged')
+
+def get_domain(url):
+    return url.split('/')[2].replace('www.', '')
+
+def init_feed_state(conn):
+    c = conn.cursor()
+    # Remembers what each feed looked like last run so we can ask "anything new?" instead of re-downloading
+    c.execute('''CREATE TABLE IF NOT EXISTS feed_state
+                 (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,
+                  body_hash TEXT, checked_at DATETIME)''')
+    conn.commit()
+
+def load_feed_state(conn):
+    c = conn.cursor()
+    c.execute("SELECT url, etag, last_modified, body_hash FROM feed_state")
+    return {url: (etag, last_modified, body_hash) for url, etag, last_modified, body_hash in c.fetchall()}
+
+def save_feed_state(conn, url, result):
+    conn.execute("""
+        INSERT OR REPLACE INTO feed_state (url, etag, last_modified, body_hash, checked_at)
+        VALUES (?, ?, ?, ?, datetime('now'))
+    """, (url, result.etag, result.last_modified, result.body_hash))
+
+def poll_feeds(urls, fetch_one, state=None, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT):
+    """Runs fetch_one(url, headers) for every feed in parallel and yields (url, FeedResult, error) as each one lands.
+
+    fetch_one must return (status_code, body_bytes, response_headers). Anything but 200 or 304 comes back
+    as an error and never reaches the caller's feed_state. The whole poll takes about
+    as long as the slowest feed instead of the sum of all of them.
+    """
+    state = state or {}
+    # One gate per host so a site listed several times is still only hit a couple of times at once
+    host_gates = {get_domain(url): threading.BoundedSemaphore(per_host) for url in urls}
+
+    def guarded_fetch(url):
+        etag, last_modified, old_hash = state.get(url, (None, None, None))
+        headers = {}
+        if etag: headers['If-None-Match'] = etag
+        if last_modified: headers['If-Modified-Since'] = last_modified
+
+        with host_gates[get_domain(url)]:
+            status, body, resp_headers = fetch_one(url, headers)
+
+        if status == 304:
+            return FeedResult(None, etag, last_modified, old_hash, True)
+        # A 403/429/5xx page is not a feed; hashing it would make a blocked feed look merely quiet
+        if status != 200:
+            raise IOError(f"HTTP {status} from {url}")
+        body_hash = hashlib.sha1(body).hexdigest()
+        return FeedResult(body, resp_headers.get('ETag'), resp_headers.get('Last-Modified'),
+                          body_hash, body_hash == old_hash)
+
+    # PER_HOST_LIMIT, not the pool size, is what keeps any one site from being hammered
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers or len(urls), len(urls)))) as pool:
+        futures = {pool.submit(guarded_fetch, url): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                yield url, future.result(), None
+            except Exception as e:
+                yield url, None, e
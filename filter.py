@@ -1,43 +1,24 @@
-import sqlite3
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import asyncio
+import json
+import sys
 from datetime import datetime
-
-# --- CONFIGURATION ---
-load_dotenv(dotenv_path="env.txt")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY").strip())
+from dedupe import init_dedupe, assign_cluster
+from llm import AsyncLLM
+import llm_cache
+import triage
+from batch_jobs import get_client, init_batch_tables, submit_batch, collect_batches
+from extractor import init_extract_queue
+from db import get_conn, get_story, get_selected_story, get_unscored_stories, save_score, prune_change_log
 
 def init_filter_db():
-    conn = sqlite3.connect('magic_rundown.db')
-    c = conn.cursor()
-    # Ensure selected_stories has the category column
-    c.execute('''CREATE TABLE IF NOT EXISTS selected_stories
-                 (id TEXT PRIMARY KEY, title TEXT, score INTEGER, 
-                  summary TEXT, link TEXT, timestamp DATETIME, category TEXT)''')
-    
-    try:
-        c.execute("ALTER TABLE selected_stories ADD COLUMN category TEXT DEFAULT 'general'")
-    except sqlite3.OperationalError:
-        pass
-        
-    conn.commit()
+    conn = get_conn()
+    # Core tables come from db.migrate(); only the filter's own side tables are created here
+    init_dedupe(conn)
+    init_batch_tables(conn)
+    init_extract_queue(conn)
     return conn
 
-def score_story(title, summary, category):
-    """Scores stories based on the Magic 96.7 demographic (Moms 35-54)."""
-    
-    # Adjusting the persona based on category for better scoring accuracy
-    persona = "General News" if category == 'general' else "Celebrity/Entertainment News"
-    
-    prompt = f"""
-    Act as a program director for Magic 96.7, a Hot AC station. 
-    Our target audience is Women 35-54. 
-    
-    Category: {persona}
-    Title: {title}
-    Summary: {summary[:500]} 
-
+SCORING_RUBRIC = """
    Act as producer for Brattleboro, VT morning show with an audience of women 35-54. Rate news topics 1-10.
 
 10: ELITE. Absurd "Stupid News," viral surveys, home hacks (cooking/cleaning), money-saving tips, or relatable lifestyle drama.
@@ -49,64 +30,244 @@ RULES:
 - DONT SKIP: High-value "stupid news" (bizarre/funny irony).
 - BOOST: +2 for VT/NH/MA locations.
 - Recipes and Clickbait/clearly sponsored posts get an automatic 1.
+"""
+
+BATCH_SIZE = 10  # Stories per scoring request; the rubric is only paid for once per batch
+PROMPT_VERSION = 'score-v1'  # Bump when the rubric or parsing changes so cached scores are ignored
 
+# --- SCORING CASCADE ---
+# Everything gets a cheap title-only score first. Only stories scoring inside the band
+# get the title + summary prompt, and that second score is final. The band runs to 10 so
+# nobody reaches the autopilot (score >= 8) on a title alone; the savings come from the
+# low scorers that are dropped without their summary ever being sent.
+CASCADE_ENABLED = True
+CASCADE_BAND = (5, 10)
+
+def get_persona(category):
+    # Adjusting the persona based on category for better scoring accuracy
+    return "General News" if category == 'general' else "Celebrity/Entertainment News"
+
+def describe_story(title, summary, full_text):
+    return f"Title: {title}\n    Summary: {summary[:500]} " if full_text else f"Title: {title}"
+
+def build_score_request(title, summary, category, full_text=True):
+    """Single-story scoring request body (shared by live scoring and the Batch API)."""
+    prompt = f"""
+    Act as a program director for Magic 96.7, a Hot AC station. 
+    Our target audience is Women 35-54. 
+    
+    Category: {get_persona(category)}
+    {describe_story(title, summary, full_text)}
+{SCORING_RUBRIC}
 Return ONLY the number.
     """
+    return dict(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], temperature=0)
+
+def parse_score(content):
+    try:
+        score = int(content.strip())
+    except (ValueError, AttributeError):
+        return None
+    return score if 1 <= score <= 10 else None
+
+async def score_story(llm, title, summary, category, full_text=True):
+    """Scores stories based on the Magic 96.7 demographic (Moms 35-54). Returns None if the AI call fails."""
+    try:
+        content = await llm.complete(PROMPT_VERSION, validate=lambda reply: parse_score(reply) is not None,
+                                     **build_score_request(title, summary, category, full_text))
+        score = parse_score(content)
+        if score is None: raise ValueError(f"unreadable score {content!r}")
+        return score
+    except Exception as e:
+        # Never invent a score; the story stays in the queue for the next run
+        print(f"   ⚠️ Scoring failed for {title[:40]}... ({e})")
+        return None
+
+def parse_batch_scores(content, keys):
+    """Pulls {"scores": {"1": 7, ...}} out of a batch reply. Anything missing or out of range is dropped."""
+    try:
+        scores = json.loads(content).get('scores', {})
+    except (ValueError, AttributeError):
+        return {}
+    valid = {}
+    for key in keys:
+        try:
+            score = int(scores[key])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 1 <= score <= 10:
+            valid[key] = score
+    return valid
+
+async def score_batch(llm, stories, category, full_text=True):
+    """Scores a list of (s_id, title, summary) in one request. Returns {s_id: score or None}.
+
+    full_text=False scores on titles alone. Stories missing from the reply fall back to a single score_story call.
+    """
+    # Short numeric keys instead of the long feed ids keep the prompt and reply small
+    numbered = {str(i): story for i, story in enumerate(stories, 1)}
+    if full_text:
+        story_block = "\n\n".join(f"STORY {key}\nTitle: {title}\nSummary: {summary[:500]}"
+                                   for key, (s_id, title, summary) in numbered.items())
+    else:
+        story_block = "\n".join(f"STORY {key}: {title}" for key, (s_id, title, summary) in numbered.items())
+    prompt = f"""
+    Act as a program director for Magic 96.7, a Hot AC station. 
+    Our target audience is Women 35-54. 
+    
+    Category: {get_persona(category)}
+{SCORING_RUBRIC}
+Score EVERY story below on its own.
+Return ONLY JSON shaped like {{"scores": {{"1": 7, "2": 3}}}} using the story numbers as keys.
+
+{story_block}
+    """
 
+    scores = {}
     try:
-        response = client.chat.completions.create(
+        content = await llm.complete(
+            PROMPT_VERSION,
+            # A reply with no usable score at all is not worth keeping; partial ones are, the gaps retry singly
+            validate=lambda reply: bool(parse_batch_scores(reply, numbered)),
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
             temperature=0
         )
-        score = int(response.choices[0].message.content.strip())
-        return score
-    except:
-        return 1
+        scores = parse_batch_scores(content, numbered)
+    except Exception as e:
+        print(f"   ⚠️ Batch scoring failed ({e}), falling back to single calls")
+
+    missing = [(key, story) for key, story in numbered.items() if key not in scores]
+    retried = await llm.map(lambda item: score_story(llm, item[1][1], item[1][2], category, full_text), missing)
+    scores.update((key, score) for (key, _), score in zip(missing, retried))
+    return {s_id: scores[key] for key, (s_id, title, summary) in numbered.items()}
+
+async def score_cascade(llm, stories, category):
+    """Title-only pass, then a full-text pass for the borderline band. Returns {s_id: (score, tier)}."""
+    if not CASCADE_ENABLED:
+        scores = await score_batch(llm, stories, category)
+        return {s_id: (score, 'full') for s_id, score in scores.items()}
+
+    title_scores = await score_batch(llm, stories, category, full_text=False)
+    low, high = CASCADE_BAND
+    # Borderline stories, plus any whose title pass failed, get the full prompt
+    second_pass = [story for story in stories
+                   if title_scores[story[0]] is None or low <= title_scores[story[0]] <= high]
+    full_scores = await score_batch(llm, second_pass, category) if second_pass else {}
 
-def run_unified_filter():
+    results = {}
+    for s_id, title, summary in stories:
+        if s_id in full_scores:
+            results[s_id] = (full_scores[s_id], 'full')
+        else:
+            results[s_id] = (title_scores[s_id], 'title')
+    return results
+
+async def score_all(jobs):
+    """Scores every (category, batch) job concurrently under the shared rate limits."""
+    async with AsyncLLM() as llm:
+        return await llm.map(
+            lambda job: score_cascade(llm, [(s_id, title, summary) for s_id, title, summary, _, _ in job[1]], job[0]),
+            jobs)
+
+def ingest_batch_scores(conn):
+    """Stores scores from any overnight batches that have finished since the last run."""
+    ingested = 0
+    for s_id, content in collect_batches(get_client(), conn, 'score'):
+        score = parse_score(content)
+        row = get_story(conn, s_id)
+        # Already scored live (e.g. by celeb_filter.py) while the batch was out; keep that score
+        if score is None or not row or get_selected_story(conn, s_id): continue
+        title, summary, link, timestamp, cat = row
+        save_score(conn, s_id, title, score, summary, link, timestamp, cat, 'batch')
+        ingested += 1
+        print(f"   [{score}/10] {title[:50]}... (batch)")
+    conn.commit()
+    return ingested
+
+def run_unified_filter(batch=False):
+    """Scores the queue live, or with batch=True collects finished Batch API results and submits the rest."""
     conn = init_filter_db()
     c = conn.cursor()
     
     # Process both categories: 'general' and 'celeb'
     categories = ['general', 'celeb']
     total_scored = 0
+    total_dupes = 0
+    total_unscored = 0
+    total_triaged = 0
 
-    print(f"\n🧠 STARTING UNIFIED FILTER: {datetime.now().strftime('%H:%M:%S')}")
+    # Local model trained on past LLM scores; obvious rejects never reach OpenAI
+    triage_model = triage.load_model()
+
+    print(f"\n🧠 STARTING UNIFIED FILTER{' (BATCH MODE)' if batch else ''}: {datetime.now().strftime('%H:%M:%S')}")
     print("-" * 65)
 
+    if batch:
+        total_scored += ingest_batch_scores(conn)
+
+    jobs = []
     for cat in categories:
         # Grab stories that haven't been scored yet for this category
-        c.execute("""
-            SELECT id, title, summary, link, timestamp 
-            FROM stories 
-            WHERE category = ? AND id NOT IN (SELECT id FROM selected_stories)
-        """, (cat,))
-        
-        queue = c.fetchall()
+        # (known near-duplicates of another story are never scored)
+        queue = get_unscored_stories(conn, cat, skip_batched=True)
         if not queue:
             print(f"✅ {cat.upper():<10} | No new stories to score.")
             continue
 
         print(f"🧐 {cat.upper():<10} | Scoring {len(queue)} stories...")
         
+        to_score = []
         for s_id, title, summary, link, timestamp in queue:
-            score = score_story(title, summary, cat)
-            
-            # Use the original harvest 'timestamp' to prevent Date Bleed
-            c.execute("""
-                INSERT OR REPLACE INTO selected_stories 
-                (id, title, score, summary, link, timestamp, category) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (s_id, title, score, summary, link, timestamp, cat))
+            # Same AP/People/E! story from another feed: only the first copy gets scored
+            if assign_cluster(c, s_id, title, summary) != s_id:
+                total_dupes += 1
+                print(f"   [DUP] {title[:50]}...")
+                continue
+
+            if triage_model and triage.reject_probability(triage_model, title, summary, cat) >= triage.REJECT_CONFIDENCE:
+                score = triage_model['reject_score']
+                save_score(conn, s_id, title, score, summary, link, timestamp, cat, 'triage')
+                total_triaged += 1
+                print(f"   [{score}/10] {title[:50]}... (triage)")
+                continue
+            to_score.append((s_id, title, summary, link, timestamp))
+
+        jobs += [(cat, to_score[i:i + BATCH_SIZE]) for i in range(0, len(to_score), BATCH_SIZE)]
+    conn.commit()
+
+    if batch and jobs:
+        # Overnight: half-price Batch API, one full-text request per story, picked up on a later run
+        requests = [(s_id, build_score_request(title, summary, cat))
+                    for cat, stories in jobs for s_id, title, summary, _, _ in stories]
+        batch_id = submit_batch(get_client(), conn, 'score', requests)
+        print(f"📤 Submitted {len(requests)} stories as batch {batch_id}. Run with --batch again to collect.")
+        jobs = []
+
+    # Every batch from both categories goes out concurrently
+    results = asyncio.run(score_all(jobs)) if jobs else []
+
+    for (cat, stories), scores in zip(jobs, results):
+        for s_id, title, summary, link, timestamp in stories:
+            score, tier = scores[s_id]
+            if score is None:
+                total_unscored += 1
+                print(f"   [--/10] {title[:50]}... (left for next run)")
+                continue
             
+            save_score(conn, s_id, title, score, summary, link, timestamp, cat, tier)
             total_scored += 1
-            print(f"   [{score}/10] {title[:50]}...")
+            print(f"   [{score}/10] {title[:50]}... ({tier})")
 
+    prune_change_log(conn)
     conn.commit()
-    conn.close()
     print("-" * 65)
-    print(f"✅ FILTER COMPLETE: {total_scored} stories ranked and categorized.")
+    print(f"✅ FILTER COMPLETE: {total_scored} stories ranked by AI, {total_triaged} rejected by triage, {total_dupes} duplicates collapsed.")
+    if total_unscored:
+        print(f"⚠️ {total_unscored} stories could not be scored and will be retried next run.")
+    llm_cache.evict()
+    llm_cache.print_stats()
 
 if __name__ == "__main__":
-    run_unified_filter()
\ No newline at end of file
+    run_unified_filter(batch='--batch' in sys.argv)
\ No newline at end of file
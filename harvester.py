@@ -1,12 +1,16 @@
 import feedparser
-import sqlite3
 import requests
 import ssl
 import time
-import trafilatura
 import re
 from datetime import datetime, timedelta
 import urllib3
+from feed_fetcher import poll_feeds, get_domain, init_feed_state, load_feed_state, save_feed_state
+from extractor import init_extract_queue, queue_extractions, run_extraction
+from canonical import canonicalize_url, init_canonical, get_known_links
+from rules import load_rules, init_rule_hits, save_rule_hits
+from db import get_conn, get_known_ids, insert_stories
+from retention import run_retention
 
 # Disable the SSL warnings for the Mac LibreSSL issue
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -36,12 +40,11 @@ FEEDS = [
 ]
 
 def init_db():
-    conn = sqlite3.connect('magic_rundown.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS stories
-                 (id TEXT PRIMARY KEY, title TEXT, summary TEXT, link TEXT, 
-                  timestamp DATETIME, raw_date TEXT, category TEXT)''')
-    conn.commit()
+    conn = get_conn()
+    init_feed_state(conn)
+    init_extract_queue(conn)
+    init_canonical(conn)
+    init_rule_hits(conn)
     return conn
 
 def extract_reddit_target_url(entry):
@@ -52,13 +55,6 @@ def extract_reddit_target_url(entry):
         if 'reddit.com' not in l: return l
     return entry.link
 
-def get_full_article_text(url):
-    try:
-        downloaded = trafilatura.fetch_url(url)
-        content = trafilatura.extract(downloaded, include_comments=False, include_tables=False)
-        return content if content else ""
-    except: return ""
-
 def harvest():
     conn = init_db()
     c = conn.cursor()
@@ -66,70 +62,95 @@ def harvest():
     cutoff = now - timedelta(days=2) 
     
     total_added = 0
+    total_blocked = 0
+    # Hard-reject rules run before anything is stored or queued for extraction
+    rule_engine = load_rules()
     print(f"\n🚀 STARTING DEEP HARVEST: {now.strftime('%H:%M:%S')}")
     print("-" * 65)
     
     session = requests.Session()
     session.headers.update({'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'})
 
-    for url in FEEDS:
-        domain = url.split('/')[2].replace('www.', '')
+    def fetch_feed(url, headers):
+        response = session.get(url, headers=headers, timeout=10, verify=False)
+        return response.status_code, response.content, response.headers
+
+    # All feeds download in parallel; each one is processed as soon as it lands
+    for url, result, error in poll_feeds(FEEDS, fetch_feed, load_feed_state(conn)):
+        domain = get_domain(url)
         # ALL STORIES NOW DEFAULT TO 'general'
         category = 'general' 
         print(f"📡 Checking {domain:.<30}", end=" ", flush=True)
         
         try:
-            response = session.get(url, timeout=10, verify=False)
-            feed = feedparser.parse(response.text)
+            if error: raise error
+            if result.unchanged:
+                # 304 or byte-for-byte the same feed as last run: nothing to parse
+                save_feed_state(conn, url, result)
+                conn.commit()
+                print("UNCHANGED")
+                continue
+            feed = feedparser.parse(result.body)
         except Exception:
             print("FAILED (Timeout)")
             continue
             
-        feed_added = 0
         process_limit = 15 if "reddit.com" in url else 30
         
+        candidates = []
+        feed_blocked = 0
         for entry in feed.entries[:process_limit]:
             real_news_link = extract_reddit_target_url(entry)
             s_id = entry.get('id', real_news_link)
-            
-            c.execute("SELECT id FROM stories WHERE id = ?", (s_id,))
-            if c.fetchone(): continue
 
             pub_date = datetime.fromtimestamp(time.mktime(entry.published_parsed)) if 'published_parsed' in entry else now
             if pub_date < cutoff: continue
+            if rule_engine.match(entry.get('title', ''), real_news_link, category):
+                feed_blocked += 1
+                continue
+            candidates.append((s_id, entry, real_news_link, pub_date))
+
+        # Same article under another id (tracking params, AMP, mobile host) counts as known too
+        canonical_links = {cand[0]: canonicalize_url(cand[2]) for cand in candidates}
+        known_ids = get_known_ids(conn, set(canonical_links))
+        known_links = get_known_links(c, set(canonical_links.values()))
+        new_rows, new_jobs = [], []
+        for s_id, entry, real_news_link, pub_date in candidates:
+            canonical_link = canonical_links[s_id]
+            if s_id in known_ids or canonical_link in known_links: continue
+            known_ids.add(s_id)
+            known_links.add(canonical_link)
 
             print(f".", end="", flush=True) 
-            full_text = get_full_article_text(real_news_link)
-            final_content = full_text if (full_text and len(full_text) > 150) else entry.get('summary', '')
 
             try:
-                # Every story is inserted with 'general' category
-                c.execute("INSERT OR REPLACE INTO stories VALUES (?, ?, ?, ?, ?, ?, ?)",
-                          (s_id, entry.title, final_content, real_news_link, 
-                           pub_date.strftime('%Y-%m-%d %H:%M:%S'), 
-                           pub_date.strftime('%Y-%m-%d'), category))
-                feed_added += 1
+                # Every story is inserted with 'general' category and the feed summary for now;
+                # the extraction stage swaps in the full article text afterwards
+                new_rows.append((s_id, entry.title, entry.get('summary', ''), real_news_link, 
+                                 pub_date.strftime('%Y-%m-%d %H:%M:%S'), 
+                                 pub_date.strftime('%Y-%m-%d'), category, canonical_link))
+                new_jobs.append((s_id, real_news_link))
             except: continue
-        
+
+        # One short write transaction per feed
+        insert_stories(conn, new_rows)
+        queue_extractions(c, new_jobs)
+        save_feed_state(conn, url, result)
+        conn.commit()
+
+        feed_added = len(new_rows)
         total_added += feed_added
-        print(f" Added {feed_added}")
+        total_blocked += feed_blocked
+        print(f" Added {feed_added}" + (f" (blocked {feed_blocked})" if feed_blocked else ""))
     
+    save_rule_hits(conn, rule_engine)
     conn.commit()
-    conn.close()
     print("-" * 65)
-    print(f"✅ HARVEST COMPLETE: {total_added} stories added to GENERAL.")
+    if total_blocked:
+        print(f"🚫 {total_blocked} stories blocked by rules.json before extraction.")
+    print(f"✅ HARVEST COMPLETE: {total_added} stories added to GENERAL in {(datetime.now() - now).seconds}s.")
 
 if __name__ == "__main__":
     harvest()
-    cleanup_old_data()
-
-def cleanup_old_data():
-    conn = sqlite3.connect('magic_rundown.db')
-    c = conn.cursor()
-    # Delete stories older than 7 days to keep the DB small
-    c.execute("DELETE FROM stories WHERE timestamp < datetime('now', '-7 days')")
-    c.execute("DELETE FROM selected_stories WHERE timestamp < datetime('now', '-7 days')")
-    # Physically shrink the file
-    c.execute("VACUUM")
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    run_extraction()
+    run_retention()
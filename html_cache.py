@@ -0,0 +1,96 @@
+import gzip
+import hashlib
+import os
+import threading
+from db import open_connection
+
+# --- CONFIGURATION ---
+CACHE_DIR = 'html_cache'                   # objects/<2 hex>/<sha256>.html.gz plus index.db
+MAX_BYTES = 500 * 1024 * 1024              # Compressed size on disk; least recently used pages go first
+
+_conn = None
+_pid = None
+_lock = threading.Lock()
+
+def get_conn():
+    # Extraction workers are separate processes; each opens its own index connection
+    global _conn, _pid
+    if _conn is None or _pid != os.getpid():
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _conn, _pid = open_connection(os.path.join(CACHE_DIR, 'index.db'), check_same_thread=False), os.getpid()
+        _conn.execute('''CREATE TABLE IF NOT EXISTS pages
+                         (url TEXT PRIMARY KEY, hash TEXT, size INTEGER, fetched_at DATETIME, last_used DATETIME)''')
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_used ON pages(last_used)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_hash ON pages(hash)")
+        _conn.commit()
+    return _conn
+
+def object_path(page_hash):
+    return os.path.join(CACHE_DIR, 'objects', page_hash[:2], f"{page_hash}.html.gz")
+
+def put(url, html):
+    """Stores the downloaded page under the hash of its content. Identical pages share one file."""
+    data = html.encode('utf-8') if isinstance(html, str) else html
+    page_hash = hashlib.sha256(data).hexdigest()
+    path = object_path(page_hash)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a reader never sees half a file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    with _lock:
+        conn = get_conn()
+        old = conn.execute("SELECT hash FROM pages WHERE url = ?", (url,)).fetchone()
+        conn.execute("""
+            INSERT OR REPLACE INTO pages (url, hash, size, fetched_at, last_used)
+            VALUES (?, ?, ?, datetime('now'), datetime('now'))
+        """, (url, page_hash, os.path.getsize(path)))
+        conn.commit()
+        # A refetch that came back different replaces the old copy; drop its file unless another URL shares it
+        if old and old[0] != page_hash:
+            drop_if_unused(conn, old[0])
+    return page_hash
+
+def drop_if_unused(conn, page_hash):
+    if conn.execute("SELECT 1 FROM pages WHERE hash = ?", (page_hash,)).fetchone(): return False
+    try:
+        os.remove(object_path(page_hash))
+    except OSError:
+        pass
+    return True
+
+def get(url):
+    """The cached HTML for `url`, or None."""
+    with _lock:
+        conn = get_conn()
+        row = conn.execute("SELECT hash FROM pages WHERE url = ?", (url,)).fetchone()
+        if not row: return None
+        conn.execute("UPDATE pages SET last_used = datetime('now') WHERE url = ?", (url,))
+        conn.commit()
+    try:
+        with gzip.open(object_path(row[0]), 'rb') as f:
+            return f.read().decode('utf-8', errors='replace')
+    except OSError:
+        return None
+
+def cached_urls():
+    with _lock:
+        return {r[0] for r in get_conn().execute("SELECT url FROM pages")}
+
+def evict(max_bytes=MAX_BYTES):
+    """Drops least recently used pages until the cache fits in max_bytes. Returns pages dropped."""
+    with _lock:
+        conn = get_conn()
+        # Shared files are only counted once
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT hash, size FROM pages)").fetchone()[0]
+        dropped = 0
+        for url, page_hash, size in conn.execute("SELECT url, hash, size FROM pages ORDER BY last_used").fetchall():
+            if total <= max_bytes: break
+            conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            dropped += 1
+            if drop_if_unused(conn, page_hash):
+                total -= size
+        conn.commit()
+    return dropped
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import random
+import time
+import openai
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+import llm_cache
+
+# --- CONFIGURATION ---
+load_dotenv(dotenv_path="env.txt")
+CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))               # Requests in flight at once
+REQUESTS_PER_MINUTE = int(os.getenv("LLM_RPM", "500"))             # Match the account's gpt-4o-mini tier
+TOKENS_PER_MINUTE = int(os.getenv("LLM_TPM", "200000"))
+MAX_RETRIES = 5
+BASE_BACKOFF = 1.0    # Seconds; doubles every retry
+MAX_BACKOFF = 60.0
+
+class TokenBucket:
+    """Refills `per_minute` units evenly over a minute; take() waits until enough are available."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.refill_rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def take(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.refill_rate)
+
+def estimate_tokens(messages, max_tokens=None):
+    # ~4 characters per token is close enough for rate limiting
+    prompt_tokens = sum(len(m['content']) for m in messages) // 4
+    return prompt_tokens + (max_tokens or 100)
+
+def is_retryable(error):
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def get_backoff(error, attempt):
+    # Honor the server's Retry-After when a 429 sends one
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        if retry_after: return min(MAX_BACKOFF, float(retry_after))
+    except ValueError:
+        pass
+    return min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt) * random.uniform(0.8, 1.2)
+
+class AsyncLLM:
+    """Concurrent OpenAI access for one event loop: a shared client, a concurrency cap,
+    requests/tokens-per-minute buckets and exponential backoff on 429 and 5xx.
+
+    Create it inside the running loop: `async with AsyncLLM() as llm: ...`
+    """
+
+    def __init__(self, concurrency=CONCURRENCY, rpm=REQUESTS_PER_MINUTE, tpm=TOKENS_PER_MINUTE):
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY").strip())
+        self.slots = asyncio.Semaphore(concurrency)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.close()
+
+    async def chat(self, **kwargs):
+        """chat.completions.create with rate limiting and retries. Raises once retries run out."""
+        estimate = estimate_tokens(kwargs['messages'], kwargs.get('max_tokens'))
+        for attempt in range(MAX_RETRIES + 1):
+            async with self.slots:
+                await self.requests.take()
+                await self.tokens.take(estimate)
+                try:
+                    return await self.client.chat.completions.create(**kwargs)
+                except Exception as e:
+                    if not is_retryable(e) or attempt == MAX_RETRIES: raise
+                    delay, reason = get_backoff(e, attempt), type(e).__name__
+            # Back off outside the slot so other requests keep moving
+            print(f"   ⏳ OpenAI busy ({reason}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def complete(self, template_version, validate=None, **kwargs):
+        """chat() through the on-disk response cache. Returns the message text.
+
+        validate(content) -> bool keeps replies the caller can't parse out of the cache, so the next run asks again.
+        """
+        key = llm_cache.make_key(template_version, kwargs['model'], kwargs.get('temperature'), kwargs['messages'],
+                                 **{k: v for k, v in kwargs.items() if k not in ('model', 'temperature', 'messages')})
+        content = llm_cache.get(key, validate)
+        if content is None:
+            response = await self.chat(**kwargs)
+            content = response.choices[0].message.content
+            if validate is None or validate(content):
+                llm_cache.put(key, content, kwargs['model'], template_version)
+        return content
+
+    async def map(self, worker, items):
+        """Runs worker(item) for every item concurrently and returns the results in order."""
+        return await asyncio.gather(*(worker(item) for item in items))
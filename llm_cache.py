@@ -0,0 +1,110 @@
+import hashlib
+import json
+import threading
+from db import open_connection
+
+# --- CONFIGURATION ---
+CACHE_PATH = 'llm_cache.db'   # Kept out of magic_rundown.db so the story DB stays small
+MAX_ENTRIES = 50000           # Least recently used answers are dropped past this
+MAX_AGE_DAYS = 30             # Nothing older than this is ever served
+
+# Hit/miss counts for this process; lifetime totals live in the cache_stats table
+HITS = 0
+MISSES = 0
+
+_conn = None
+_lock = threading.Lock()
+
+def get_conn():
+    global _conn
+    if _conn is None:
+        _conn = open_connection(CACHE_PATH, check_same_thread=False)
+        _conn.execute('''CREATE TABLE IF NOT EXISTS llm_cache
+                         (key TEXT PRIMARY KEY, content TEXT, model TEXT, template_version TEXT,
+                          created_at DATETIME, last_used DATETIME)''')
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+        _conn.execute("CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER)")
+        _conn.commit()
+    return _conn
+
+def make_key(template_version, model, temperature, messages, **options):
+    """Content address for one request: same prompt template + model + temperature + inputs = same key."""
+    payload = json.dumps([template_version, model, temperature, messages, options], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _bump(name):
+    get_conn().execute("""
+        INSERT INTO cache_stats (name, value) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1
+    """, (name,))
+
+def get(key, validate=None):
+    global HITS, MISSES
+    with _lock:
+        conn = get_conn()
+        row = conn.execute("""
+            SELECT content FROM llm_cache
+            WHERE key = ? AND created_at >= datetime('now', ?)
+        """, (key, f'-{MAX_AGE_DAYS} days')).fetchone()
+        if row and validate is not None and not validate(row[0]):
+            # Stored before validation existed; drop it so a fresh answer can replace it
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            row = None
+        if row:
+            HITS += 1
+            _bump('hits')
+            conn.execute("UPDATE llm_cache SET last_used = datetime('now') WHERE key = ?", (key,))
+        else:
+            MISSES += 1
+            _bump('misses')
+        conn.commit()
+        return row[0] if row else None
+
+def put(key, content, model, template_version):
+    with _lock:
+        conn = get_conn()
+        conn.execute("""
+            INSERT OR REPLACE INTO llm_cache (key, content, model, template_version, created_at, last_used)
+            VALUES (?, ?, ?, ?, datetime('now'), datetime('now'))
+        """, (key, content, model, template_version))
+        conn.commit()
+
+def evict():
+    """Drops expired answers, then the least recently used ones beyond MAX_ENTRIES."""
+    with _lock:
+        conn = get_conn()
+        expired = conn.execute("DELETE FROM llm_cache WHERE created_at < datetime('now', ?)",
+                               (f'-{MAX_AGE_DAYS} days',)).rowcount
+        overflow = conn.execute("""
+            DELETE FROM llm_cache WHERE key IN
+            (SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)
+        """, (MAX_ENTRIES,)).rowcount
+        conn.commit()
+        return expired + overflow
+
+def cached_completion(client, template_version, validate=None, **kwargs):
+    """Sync chat completion through the cache. Returns the message text.
+
+    Replies failing validate(content) are returned but not stored.
+    """
+    key = make_key(template_version, kwargs['model'], kwargs.get('temperature'), kwargs['messages'],
+                   **{k: v for k, v in kwargs.items() if k not in ('model', 'temperature', 'messages')})
+    content = get(key, validate)
+    if content is None:
+        response = client.chat.completions.create(**kwargs)
+        content = response.choices[0].message.content
+        if validate is None or validate(content):
+            put(key, content, kwargs['model'], template_version)
+    return content
+
+def print_stats():
+    conn = get_conn()
+    totals = dict(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+    entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+    hits, misses = totals.get('hits', 0), totals.get('misses', 0)
+    rate = 100 * hits / (hits + misses) if hits + misses else 0
+    print(f"🗄  LLM CACHE: {entries} answers | {hits} hits / {misses} misses ({rate:.0f}% hit rate)")
+
+if __name__ == "__main__":
+    print(f"🧹 Evicted {evict()} stale answers.")
+    print_stats()
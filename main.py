@@ -1,9 +1,12 @@
-import sqlite3, os, asyncio
+import os, asyncio
 from datetime import datetime
 from urllib.parse import urlparse
 from nicegui import app, ui, background_tasks
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+import llm_cache
+import db
+from batch_jobs import init_batch_tables
 import time, threading, signal, os
 
 # --- WATCHDOG CONFIGURATION ---
@@ -24,18 +27,44 @@ threading.Thread(target=watchdog_monitor, daemon=True).start()
 
 # --- CONFIGURATION ---
 load_dotenv(dotenv_path="env.txt")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY").strip())
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY").strip())
+PROMPT_VERSION = 'manual-prep-v1'  # Bump when the manual prep prompt changes
+
+# --- PREFETCH CONFIGURATION ---
+# While a view is open, preps for its best unprepped stories are generated in the background
+# so clicking one comes straight out of the cache
+PREFETCH_TOP_N = 5
+PREFETCH_MIN_SCORE = 7
+PREFETCH_CONCURRENCY = 2
+
+# --- LIVE UPDATES ---
+WATCH_INTERVAL = 2.0  # Seconds between checks for writes from the cron scripts
+
+# Status pill on each story card
+STATUS_CLASSES = {
+    'AIRED': 'text-[10px] font-black text-white bg-red-600 px-1 rounded',
+    'PREPPED': 'text-[10px] font-bold text-emerald-600 bg-emerald-50 px-1 rounded',
+}
+
+def build_prep_prompt(title, summary):
+    return f"Write a 20-word TEASE, then '###', then a 100-word FULL STORY using ellipses (...) for: {title}. Details: {summary}"
 
 # --- BRANDING & STYLES ---
 ui.query('body').style('background-color: #ffffff; color: #333333; font-family: "Helvetica Neue", Arial, sans-serif;')
 
 class MagicRundownApp:
     def __init__(self):
-        self.db_path = 'magic_rundown.db'
+        self.db_path = db.DB_PATH
         self.current_date = datetime.now().strftime('%Y-%m-%d')
         self.active_category = 'general' 
+        self.prefetch_task = None
+        self.prefetching = {}  # prompt -> in-flight background prep
+        self.cards = {}        # s_id -> the story card on screen and what it currently shows
+        self.open_story = None # s_id shown in the detail pane
         self.migrate_db() 
         self.render_ui()
+        ui.timer(0.1, self.start_prefetch, once=True)
+        ui.timer(WATCH_INTERVAL, self.watch_db)
         
         # This tells the browser to keep Python alive every 5 seconds
         ui.timer(5.0, self.pulse)
@@ -47,89 +76,166 @@ class MagicRundownApp:
         last_heartbeat = time.time()
 
     def migrate_db(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        # Ensure radio_scripts supports 8 columns: id, tease, full_story, source_name, link, timestamp, is_aired, category
-        c.execute('''CREATE TABLE IF NOT EXISTS radio_scripts
-                     (id TEXT PRIMARY KEY, tease TEXT, full_story TEXT, 
-                      source_name TEXT, link TEXT, timestamp DATETIME, 
-                      is_aired INTEGER DEFAULT 0, category TEXT DEFAULT 'general')''')
-        conn.commit()
-        conn.close()
+        # Opening the shared connection runs any pending schema migrations (db.MIGRATIONS)
+        conn = db.get_conn(self.db_path)
+        # Lets the prefetch skip stories whose scripts are already paid for in a pending Batch API run
+        init_batch_tables(conn)
+        self.data_version = db.get_data_version(conn)
+        self.change_seq = db.get_last_change(conn)
+
+    def watch_db(self):
+        """Pushes rows the harvest/filter/autopilot scripts changed into the open view.
+
+        PRAGMA data_version is a free check; the change_log is only read once another process has committed.
+        """
+        conn = db.get_conn(self.db_path)
+        version = db.get_data_version(conn)
+        if version == self.data_version: return
+        self.data_version = version
+        self.change_seq, changed = db.get_changes(conn, self.change_seq)
+        if not changed: return
+
+        self.update_story_list(changed)
+        self.refresh_dates()
+        if self.open_story in changed:
+            self.show_details(self.open_story)
 
     def get_dates(self):
-        try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute("SELECT DISTINCT date(timestamp) FROM selected_stories ORDER BY timestamp DESC")
-            dates = [r[0] for r in c.fetchall()]
-            conn.close()
-            if self.current_date not in dates:
-                dates.insert(0, self.current_date)
-            return dates
-        except: return [self.current_date]
-
-    def toggle_aired(self, s_id, current_val, title, summary, score, link):
+        """{date: label} for the date picker, straight from daily_rollup."""
+        dates = {story_date: f"{story_date} ({scored} · {high} high · {prepped} prepped · {aired} aired)"
+                 for story_date, scored, high, prepped, aired in db.get_rollup(db.get_conn(self.db_path))}
+        if self.current_date not in dates:
+            dates = {self.current_date: self.current_date, **dates}
+        return dates
+
+    def refresh_dates(self):
+        self.date_select.set_options(self.get_dates(), value=self.current_date)
+
+    def toggle_aired(self, s_id, current_val):
         new_val = 1 if current_val == 0 else 0
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("UPDATE radio_scripts SET is_aired = ? WHERE id = ?", (new_val, s_id))
+        conn = db.get_conn(self.db_path)
+        db.set_aired(conn, s_id, new_val)
         conn.commit()
-        conn.close()
-        self.story_list.refresh()
-        self.show_details(title, summary, score, link, s_id)
+        self.update_story_list()
+        self.refresh_dates()
+        self.show_details(s_id)
+
+    async def stream_prep(self, prompt, on_text):
+        """Streams the prep, calling on_text(text_so_far) as tokens arrive. Cached preps come back instantly."""
+        request = dict(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], temperature=0.3)
+        key = llm_cache.make_key(PROMPT_VERSION, request['model'], request['temperature'], request['messages'])
+        content = llm_cache.get(key)
+        if content is not None:
+            on_text(content)
+            return content
+
+        content = ''
+        stream = await client.chat.completions.create(**request, stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                content += chunk.choices[0].delta.content
+                on_text(content)
+        llm_cache.put(key, content, request['model'], PROMPT_VERSION)
+        return content
+
+    def start_prefetch(self):
+        """(Re)starts background prep generation for the current date and tab, cancelling the old view's run."""
+        if self.prefetch_task and not self.prefetch_task.done():
+            self.prefetch_task.cancel()
+        self.prefetch_task = background_tasks.create(self.prefetch_preps(self.current_date, self.active_category))
+
+    async def prefetch_preps(self, date, category):
+        stories = db.get_unprepped_stories(db.get_conn(self.db_path), PREFETCH_MIN_SCORE,
+                                           category=category, date=date, limit=PREFETCH_TOP_N,
+                                           skip_batched=True)
+
+        slots = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+        async def prefetch(prompt, title):
+            async with slots:
+                try:
+                    await self.stream_prep(prompt, lambda text: None)
+                except Exception as e:
+                    print(f"⚠️ Prefetch failed for {title[:40]}... ({e})")
 
-    async def generate_prep(self, title, summary, link, s_id, score, button):
+        self.prefetching = {}
+        for s_id, title, summary, *_ in stories:
+            prompt = build_prep_prompt(title, summary)
+            self.prefetching[prompt] = asyncio.ensure_future(prefetch(prompt, title))
+        # Cancelling this task (tab or date change) cancels every prep still in flight
+        await asyncio.gather(*self.prefetching.values())
+
+    async def generate_prep(self, s_id, button):
         button.disable()
-        # ... spinner logic ...
+        story_row = db.get_selected_story(db.get_conn(self.db_path), s_id)
+        if not story_row: return
+        title, summary, link, *_ = story_row
         
-        prompt = f"Write a 20-word TEASE, then '###', then a 100-word FULL STORY using ellipses (...) for: {title}. Details: {summary}"
+        prompt = build_prep_prompt(title, summary)
+
+        # Live card that fills in word by word while the prep streams (live updates leave it alone)
+        self.detail_pane.clear()
+        self.open_story = None
+        with self.detail_pane:
+            with ui.card().classes('w-full p-8 bg-white border-t-8 border-[#8B1D22] shadow-lg'):
+                ui.label(title).classes('text-3xl font-black text-gray-900 mb-6 uppercase')
+                loading = ui.spinner(size='lg', color='#8B1D22').classes('mb-4')
+                ui.label('TEASE').classes('text-[#8B1D22] font-black text-xs tracking-widest')
+                tease_label = ui.label('').classes('text-xl font-medium mb-10 text-gray-800 italic')
+                ui.label('FULL STORY').classes('text-[#8B1D22] font-black text-xs tracking-widest')
+                story_md = ui.markdown('').classes('text-lg leading-relaxed text-gray-700')
+
+        def render(text):
+            tease, _, story = text.partition('###')
+            tease_label.set_text(tease.strip())
+            story_md.set_content(story.strip())
         
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, lambda: client.chat.completions.create(
-                model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], temperature=0.3
-            ))
-            content = response.choices[0].message.content.strip()
-            
-            # Split using the new reliable delimiter
-            if "###" in content:
-                parts = content.split("###")
-                tease = parts[0].strip()
-                story = parts[1].strip()
-            else:
-                tease = "Check out this story..."
-                story = content
-
-            # ... database save logic (Ensure you use all 8 columns!) ...
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            # FIX: Exactly 8 columns to match schema
-            c.execute("INSERT OR REPLACE INTO radio_scripts VALUES (?, ?, ?, ?, ?, datetime('now'), 0, ?)",
-                      (s_id, tease, story, domain, link, self.active_category))
-            conn.commit()
-            conn.close()
-            self.show_details(title, summary, score, link, s_id)
-            self.story_list.refresh()
-        finally:
-            loading.delete()
-
-    def show_details(self, title, summary, score, link, s_id):
+            # Already being prefetched: let that finish so this one is a cache hit instead of a second call
+            pending = self.prefetching.get(prompt)
+            if pending and not pending.done():
+                await asyncio.wait([pending])
+            content = (await self.stream_prep(prompt, render)).strip()
+        except Exception as e:
+            ui.notify(f'Prep failed: {e}', type='negative')
+            self.show_details(s_id)
+            return
+        loading.delete()
+
+        # Split using the new reliable delimiter
+        if "###" in content:
+            parts = content.split("###")
+            tease = parts[0].strip()
+            story = parts[1].strip()
+        else:
+            tease = "Check out this story..."
+            story = content
+
+        conn = db.get_conn(self.db_path)
+        db.save_script(conn, s_id, tease, story, link, category=self.active_category)
+        conn.commit()
+        self.show_details(s_id)
+        self.update_story_list()
+        self.refresh_dates()
+
+    def show_details(self, s_id):
+        # Body and script are loaded only for the story being opened
+        conn = db.get_conn(self.db_path)
+        story_row = db.get_selected_story(conn, s_id)
         self.detail_pane.clear()
+        self.open_story = s_id if story_row else None
+        if not story_row: return
+        title, summary, link, *_ = story_row
         domain = urlparse(link).netloc.replace('www.', '')
         with self.detail_pane:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute("SELECT tease, full_story, is_aired FROM radio_scripts WHERE id = ?", (s_id,))
-            saved = c.fetchone()
-            conn.close()
+            saved = db.get_script(conn, s_id)
 
             if saved:
                 tease, story, is_aired = saved
                 with ui.card().classes('w-full p-8 bg-white border-t-8 border-[#8B1D22] shadow-lg'):
                     ui.label(title).classes('text-3xl font-black text-gray-900 mb-6 uppercase')
                     btn_text = 'MARK AS UNUSED' if is_aired else 'MARK AS AIRED'
-                    ui.button(btn_text, on_click=lambda: self.toggle_aired(s_id, is_aired, title, summary, score, link)) \
+                    ui.button(btn_text, on_click=lambda: self.toggle_aired(s_id, is_aired)) \
                         .style(f'background-color: {"#cbd5e1" if is_aired else "#8B1D22"}; color: white;').classes('mb-8 font-bold px-6')
                     ui.label('TEASE').classes('text-[#8B1D22] font-black text-xs tracking-widest')
                     ui.label(tease).classes('text-xl font-medium mb-10 text-gray-800 italic')
@@ -140,34 +246,69 @@ class MagicRundownApp:
                 with ui.card().classes('w-full p-8 bg-white shadow-md border-l-8 border-gray-200'):
                     ui.label(title).classes('text-2xl font-bold mb-4')
                     ui.label(summary[:500] + "...").classes('text-gray-500 mb-8 italic')
-                    ui.button('MANUALLY GENERATE MAGIC 96.7 PREP', on_click=lambda e: self.generate_prep(title, summary, link, s_id, score, e.sender)) \
+                    ui.button('MANUALLY GENERATE MAGIC 96.7 PREP', on_click=lambda e: self.generate_prep(s_id, e.sender)) \
                         .style('background-color: #333333; color: white;').classes('w-full py-4 font-bold rounded-lg')
 
-    @ui.refreshable
-    def story_list(self):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT score, title, summary, link, id FROM selected_stories WHERE date(timestamp) = ? AND category = ? ORDER BY score DESC", (self.current_date, self.active_category))
-        stories = c.fetchall()
-        c.execute("SELECT id, is_aired FROM radio_scripts")
-        status_map = {r[0]: r[1] for r in c.fetchall()}
-        conn.close()
-
-        with ui.column().classes('w-full gap-3'):
-            for score, title, summary, link, s_id in stories:
-                is_prepped = s_id in status_map
-                is_aired = status_map.get(s_id, 0) == 1
-                color = "#8B1D22" if score >= 8 else "#cbd5e1"
-                opacity = 'opacity-40' if is_aired else 'opacity-100'
-                with ui.card().classes(f'w-full bg-white border-l-8 cursor-pointer hover:shadow-md p-4 {opacity}').style(f'border-color: {color}') \
-                    .on('click', lambda t=title, s=summary, sc=score, l=link, sid=s_id: self.show_details(t, s, sc, l, sid)):
-                    with ui.row().classes('w-full no-wrap items-start justify-between'):
-                        with ui.column().classes('w-10/12'):
-                            ui.label(title).classes('font-bold text-gray-800 text-base leading-tight')
-                            with ui.row().classes('items-center gap-2 mt-1'):
-                                if is_aired: ui.label('AIRED').classes('text-[10px] font-black text-white bg-red-600 px-1 rounded')
-                                elif is_prepped: ui.label('PREPPED').classes('text-[10px] font-bold text-emerald-600 bg-emerald-50 px-1 rounded')
-                        ui.badge(str(score), color=color).classes('p-2 font-black') # RESTORED THE RATING BADGE
+    def story_state(self, score, is_prepped, is_aired):
+        """What a card shows besides its title: (score, status label, opacity class)."""
+        status = 'AIRED' if is_aired else 'PREPPED' if is_prepped else ''
+        return score, status, 'opacity-40' if is_aired else 'opacity-100'
+
+    def build_card(self, title, s_id, state):
+        score, status, opacity = state
+        color = "#8B1D22" if score >= 8 else "#cbd5e1"
+        with ui.card().classes(f'w-full bg-white border-l-8 cursor-pointer hover:shadow-md p-4 {opacity}').style(f'border-color: {color}') \
+            .on('click', lambda sid=s_id: self.show_details(sid)) as card:
+            with ui.row().classes('w-full no-wrap items-start justify-between'):
+                with ui.column().classes('w-10/12'):
+                    ui.label(title).classes('font-bold text-gray-800 text-base leading-tight')
+                    with ui.row().classes('items-center gap-2 mt-1'):
+                        status_label = ui.label(status).classes(STATUS_CLASSES.get(status, ''))
+                        status_label.set_visibility(bool(status))
+                ui.badge(str(score), color=color).classes('p-2 font-black') # RESTORED THE RATING BADGE
+        return card, status_label
+
+    def update_story_list(self, changed=None):
+        """Diffs the current date/tab against the cards on screen and only touches what changed.
+
+        New stories get a card, gone ones are deleted, and an aired/prepped change just patches
+        that card's label and opacity. Cards are only moved when the order actually changed.
+        changed= only re-reads those story ids (live updates) instead of the whole tab.
+        """
+        conn = db.get_conn(self.db_path)
+        stories = db.get_story_list(conn, self.current_date, self.active_category, ids=changed)
+
+        checked = set(self.cards) if changed is None else set(changed) & set(self.cards)
+        for s_id in checked - {s_id for s_id, *_ in stories}:
+            self.cards.pop(s_id)['card'].delete()
+
+        for s_id, title, score, is_prepped, is_aired in stories:
+            state = self.story_state(score, is_prepped, is_aired)
+            entry = self.cards.get(s_id)
+            if entry and entry['title'] == title and entry['state'][0] == score:
+                if entry['state'] != state:
+                    _, status, opacity = state
+                    entry['status'].set_text(status)
+                    entry['status'].classes(replace=STATUS_CLASSES.get(status, ''))
+                    entry['status'].set_visibility(bool(status))
+                    entry['card'].classes(remove='opacity-40 opacity-100', add=opacity)
+                    entry['state'] = state
+                continue
+
+            # New story, or its score/title changed: (re)build just this card
+            if entry: entry['card'].delete()
+            with self.list_column:
+                card, status_label = self.build_card(title, s_id, state)
+            self.cards[s_id] = {'card': card, 'status': status_label, 'title': title, 'state': state}
+
+        # Best score first; ties keep their place on screen
+        on_screen = [child.id for child in self.list_column]
+        position = {card_id: index for index, card_id in enumerate(on_screen)}
+        order = sorted(self.cards, key=lambda s_id: (-self.cards[s_id]['state'][0],
+                                                      position.get(self.cards[s_id]['card'].id, len(position))))
+        if on_screen != [self.cards[s_id]['card'].id for s_id in order]:
+            for index, s_id in enumerate(order):
+                self.cards[s_id]['card'].move(self.list_column, index)
 
     def render_ui(self):
         with ui.header().classes('bg-white p-4 border-b-4 border-[#8B1D22] items-center justify-between shadow-sm'):
@@ -177,12 +318,13 @@ class MagicRundownApp:
                 with tabs:
                     ui.tab('general', label='GENERAL')
                     ui.tab('celeb', label='CELEBRITY')
-                tabs.on('update:model-value', lambda e: [setattr(self, 'active_category', e.args), self.story_list.refresh(), self.detail_pane.clear()])
-                ui.select(self.get_dates(), value=self.current_date, on_change=lambda e: [setattr(self, 'current_date', e.value), self.story_list.refresh()]).classes('w-44 border rounded')
+                tabs.on('update:model-value', lambda e: [setattr(self, 'active_category', e.args), self.update_story_list(), self.detail_pane.clear(), setattr(self, 'open_story', None), self.start_prefetch()])
+                self.date_select = ui.select(self.get_dates(), value=self.current_date, on_change=lambda e: [setattr(self, 'current_date', e.value), self.update_story_list(), self.start_prefetch()]).classes('w-80 border rounded')
 
         with ui.row().classes('w-full h-screen no-wrap'):
             with ui.column().classes('w-2/5 p-6 bg-slate-50 border-r h-full overflow-y-auto'):
-                self.story_list()
+                self.list_column = ui.column().classes('w-full gap-3')
+                self.update_story_list()
             with ui.column().classes('w-3/5 p-12 bg-white h-full overflow-y-auto'):
                 self.detail_pane = ui.column().classes('w-full')
 
@@ -0,0 +1,148 @@
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from db import get_conn, refresh_rollup, put_bodies, delete_orphan_bodies, BODY_TABLES
+from dedupe import init_dedupe
+
+# --- CONFIGURATION ---
+RETENTION_DAYS = 7         # Rows older than this leave the live DB
+ARCHIVE_DIR = 'archive'    # archive/<table>/<YYYY-MM-DD>.jsonl.gz, one gzip member appended per run
+VACUUM_PAGES = 256         # Pages handed back to the OS per step (1 MB at the default 4 KB page size)
+VACUUM_PAUSE = 0.05        # Seconds between steps so the dashboard can get a lock in
+# Archived with every column; the order matters for restore (scores before scripts)
+ARCHIVED_TABLES = ('stories', 'selected_stories', 'radio_scripts')
+
+def enable_incremental_vacuum(conn):
+    """Switches the file to auto_vacuum=INCREMENTAL. Needs one full VACUUM the first time only."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: return
+    print("🛠 Switching to incremental auto-vacuum (one-time full VACUUM)...")
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+def archive_path(table, day):
+    return os.path.join(ARCHIVE_DIR, table, f"{day}.jsonl.gz")
+
+def archive_rows(table, day, rows):
+    os.makedirs(os.path.join(ARCHIVE_DIR, table), exist_ok=True)
+    # Append mode adds a new gzip member; gzip.open reads them all back as one stream
+    with gzip.open(archive_path(table, day), 'at', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+def archive_expired(conn, days=RETENTION_DAYS):
+    """Moves rows older than `days` into the archive, one day per transaction. Returns rows moved."""
+    cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    moved = 0
+    for table in ARCHIVED_TABLES:
+        expired_days = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT date(timestamp) FROM {table} WHERE timestamp < ?", (cutoff,))]
+        for day in expired_days:
+            # Article text goes into the archive itself, not a hash pointing at a body that is about to be deleted
+            body = ", body_text(b.body) AS archived_body" if table in BODY_TABLES else ""
+            join = "LEFT JOIN article_bodies b ON b.hash = t.body_hash" if table in BODY_TABLES else ""
+            cursor = conn.execute(f"SELECT t.*{body} FROM {table} t {join} WHERE t.timestamp < ? AND date(t.timestamp) IS ?",
+                                  (cutoff, day))
+            columns = [d[0] for d in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor]
+            for row in rows:
+                if 'archived_body' in row:
+                    row['summary'] = row.pop('archived_body')
+                    row.pop('body_hash')
+            archive_rows(table, day, rows)
+            # Picker days these rows were counted under; the cutoff day is usually only partly archived
+            touched = conn.execute(f"""
+                SELECT DISTINCT s.story_date, s.category FROM selected_stories s JOIN {table} t ON t.id = s.id
+                WHERE t.timestamp < ? AND date(t.timestamp) IS ?
+            """, (cutoff, day)).fetchall()
+            conn.execute(f"DELETE FROM {table} WHERE timestamp < ? AND date(timestamp) IS ?", (cutoff, day))
+            refresh_rollup(conn, *touched)
+            conn.commit()
+            moved += len(rows)
+            print(f"   📦 {table:<17} {day}: {len(rows)} rows archived")
+
+    # Bookkeeping for stories that are gone
+    conn.execute("DELETE FROM story_fingerprints WHERE created_at < ?", (cutoff,))
+    conn.execute("DELETE FROM daily_rollup WHERE story_date < date(?)", (cutoff,))
+    conn.execute("DELETE FROM change_log WHERE changed_at < ?", (cutoff,))
+    orphans = delete_orphan_bodies(conn)
+    conn.commit()
+    if orphans: print(f"   🗑  {orphans} article bodies no longer referenced")
+    return moved
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES):
+    """Returns free pages to the OS in small steps instead of rewriting the whole file. Returns pages freed."""
+    freed = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free: return freed
+        # executescript runs the pragma to completion; through execute() it stops after a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({min(pages, free)})")
+        step = free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if step <= 0: return freed
+        freed += step
+        time.sleep(VACUUM_PAUSE)
+
+def run_retention(days=RETENTION_DAYS):
+    conn = get_conn()
+    init_dedupe(conn)
+    print(f"\n🧹 RETENTION: archiving anything older than {days} days")
+    print("-" * 65)
+    enable_incremental_vacuum(conn)
+    moved = archive_expired(conn, days)
+    freed = incremental_vacuum(conn)
+    print("-" * 65)
+    print(f"✅ RETENTION COMPLETE: {moved} rows archived, {freed} pages freed.")
+
+def read_archive(table, day):
+    path = archive_path(table, day)
+    if not os.path.exists(path): return []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    # A restored day that expires again is archived twice; the latest copy of each row wins
+    return list({row['id']: row for row in rows}.values())
+
+def query_archive(text, table='selected_stories'):
+    """Prints archived rows of `table` whose title (or tease) contains `text`, oldest day first."""
+    folder = os.path.join(ARCHIVE_DIR, table)
+    days = sorted(name[:-len('.jsonl.gz')] for name in os.listdir(folder)) if os.path.isdir(folder) else []
+    found = 0
+    for day in days:
+        for row in read_archive(table, day):
+            if text.lower() in (row.get('title') or row.get('tease') or '').lower():
+                found += 1
+                print(f"{day}  {row['id'][:60]:<60}  {(row.get('title') or row.get('tease'))[:70]}")
+    print(f"🔎 {found} archived {table} rows match '{text}'.")
+
+def restore_day(day):
+    """Puts one archived day back into the live DB. Rows that are already there are left alone."""
+    conn = get_conn()
+    restored = 0
+    for table in ARCHIVED_TABLES:
+        rows = read_archive(table, day)
+        for row in rows:
+            if table in BODY_TABLES and row.get('summary') is not None:
+                row['body_hash'], row['summary'] = put_bodies(conn, [row['summary']])[0], None
+            columns = list(row)
+            conn.execute(f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                         [row[c] for c in columns])
+        restored += len(rows)
+    # Rebuild that day's picker counts
+    refresh_rollup(conn, *conn.execute(
+        "SELECT DISTINCT story_date, category FROM selected_stories WHERE story_date = ?", (day,)).fetchall())
+    conn.commit()
+    print(f"♻️ Restored {restored} rows from {day}. The next retention run archives them again unless RETENTION_DAYS changes.")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if command == 'run':
+        run_retention()
+    elif command == 'query' and len(sys.argv) > 2:
+        query_archive(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else 'selected_stories')
+    elif command == 'restore' and len(sys.argv) > 2:
+        restore_day(sys.argv[2])
+    else:
+        print("Usage: python retention.py [run | query <text> [table] | restore <YYYY-MM-DD>]")
@@ -0,0 +1,67 @@
+import json
+import re
+from collections import Counter
+from urllib.parse import urlparse
+
+# --- CONFIGURATION ---
+RULES_PATH = 'rules.json'
+FIELDS = ('title', 'url', 'domain')
+
+class RuleEngine:
+    """Hard-reject rules compiled into one case-insensitive regex per (category, field).
+
+    Each rule in rules.json has a name, a field (title / url / domain), the categories it applies to
+    (omit for all) and a list of phrases (plain substrings) or, with "regex": true, patterns.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.hits = Counter()
+        self.compiled = {}
+
+    def get_matcher(self, category, field):
+        key = (category, field)
+        if key not in self.compiled:
+            groups = []
+            for i, rule in enumerate(self.rules):
+                if rule.get('field', 'title') != field: continue
+                if 'categories' in rule and category not in rule['categories']: continue
+                patterns = rule['phrases'] if rule.get('regex') else [re.escape(p) for p in rule['phrases']]
+                if patterns:
+                    groups.append(f"(?P<r{i}>{'|'.join(patterns)})")
+            # None when no rule covers this field, so we skip the search entirely
+            self.compiled[key] = re.compile('|'.join(groups), re.IGNORECASE) if groups else None
+        return self.compiled[key]
+
+    def match(self, title, url, category):
+        """Returns the name of the first rule that rejects this story, or None."""
+        values = {'title': title or '', 'url': url or '',
+                  'domain': (urlparse(url or '').hostname or '').replace('www.', '')}
+        for field in FIELDS:
+            matcher = self.get_matcher(category, field)
+            if not matcher: continue
+            m = matcher.search(values[field])
+            if m:
+                name = self.rules[int(m.lastgroup[1:])]['name']
+                self.hits[name] += 1
+                return name
+        return None
+
+def load_rules(path=RULES_PATH):
+    with open(path) as f:
+        return RuleEngine(json.load(f)['rules'])
+
+def init_rule_hits(conn):
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS rule_hits
+                 (rule TEXT PRIMARY KEY, hits INTEGER DEFAULT 0, last_hit DATETIME)''')
+    conn.commit()
+
+def save_rule_hits(conn, engine):
+    """Adds this run's per-rule hit counts to the running totals."""
+    conn.executemany("""
+        INSERT INTO rule_hits (rule, hits, last_hit) VALUES (?, ?, datetime('now'))
+        ON CONFLICT(rule) DO UPDATE SET hits = hits + excluded.hits, last_hit = excluded.last_hit
+    """, list(engine.hits.items()))
+    conn.commit()
+    engine.hits.clear()
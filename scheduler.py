@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+
+# --- CONFIGURATION ---
+MAX_WORKERS = 4   # Scripts written at the same time
+
+def parse_deadline(value):
+    """'06:00' -> the next 6:00 AM as a datetime."""
+    hour, minute = (int(part) for part in value.split(':'))
+    deadline = datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return deadline if deadline > datetime.now() else deadline + timedelta(days=1)
+
+def get_deadline(argv):
+    """Reads `--deadline HH:MM` from the command line, if given."""
+    if '--deadline' in argv and argv.index('--deadline') + 1 < len(argv):
+        return parse_deadline(argv[argv.index('--deadline') + 1])
+    return None
+
+def bounded_client(client, deadline):
+    """`client` with a request timeout of whatever time is left, so calls already in flight end with the deadline.
+
+    No retries either: a call that runs out of time leaves its item queued for the next run.
+    """
+    if not deadline: return client
+    seconds_left = (deadline - datetime.now()).total_seconds()
+    return client.with_options(timeout=max(1.0, seconds_left), max_retries=0)
+
+def run_prioritized(items, worker, max_workers=MAX_WORKERS, deadline=None):
+    """Runs worker(item) with bounded parallelism, starting items strictly in the order given.
+
+    Yields (item, result) as each one finishes. Nothing new is started once the deadline passes;
+    items never started are simply not yielded, so they stay queued for the next run. Workers
+    should make their API calls through bounded_client() so the ones running stop in time too.
+    """
+    pending = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+
+        def start_next():
+            if deadline and datetime.now() >= deadline: return False
+            item = next(pending, None)
+            if item is None: return False
+            running[pool.submit(worker, item)] = item
+            return True
+
+        while len(running) < max_workers and start_next():
+            pass
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    result = None
+                yield item, result
+                start_next()
@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import random
+import re
+import sys
+import zlib
+from datetime import datetime
+from db import DB_PATH, get_conn, get_training_rows
+
+# --- CONFIGURATION ---
+MODEL_PATH = 'triage_model.json'
+N_BUCKETS = 2 ** 18          # Hashed vocabulary size
+REJECT_MAX = 3               # LLM scores at or below this are "obvious rejects"
+REJECT_CONFIDENCE = 0.9      # Only skip the LLM when the model is at least this sure
+MIN_TRAINING_ROWS = 300
+HOLDOUT_FRACTION = 0.2
+EPOCHS = 8
+LEARNING_RATE = 0.5
+L2 = 1e-6
+
+def tokenize(title, summary, category):
+    words = re.findall(r"[a-z0-9']+", f"{title} {title} {(summary or '')[:1000]}".lower())
+    tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    tokens.append(f"__category={category}")
+    return tokens
+
+def bucket(token):
+    # crc32 is stable across runs, unlike hash()
+    return zlib.crc32(token.encode()) % N_BUCKETS
+
+def term_counts(title, summary, category):
+    counts = {}
+    for token in tokenize(title, summary, category):
+        b = bucket(token)
+        counts[b] = counts.get(b, 0) + 1
+    return counts
+
+def vectorize(counts, idf, default_idf):
+    """Hashed TF-IDF: log-scaled term counts times IDF, L2-normalized. Returns {bucket: value}."""
+    vec = {b: (1 + math.log(n)) * idf.get(b, default_idf) for b, n in counts.items()}
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {b: v / norm for b, v in vec.items()}
+
+def sigmoid(z):
+    if z < -30: return 0.0
+    if z > 30: return 1.0
+    return 1 / (1 + math.exp(-z))
+
+def train_logistic(vectors, labels):
+    weights, bias = {}, 0.0
+    rows = list(zip(vectors, labels))
+    rng = random.Random(42)
+    for epoch in range(EPOCHS):
+        rng.shuffle(rows)
+        rate = LEARNING_RATE / (1 + epoch)
+        for vec, label in rows:
+            z = bias + sum(weights.get(b, 0.0) * v for b, v in vec.items())
+            error = sigmoid(z) - label
+            bias -= rate * error
+            for b, v in vec.items():
+                w = weights.get(b, 0.0)
+                weights[b] = w - rate * (error * v + L2 * w)
+    return weights, bias
+
+def load_model(path=MODEL_PATH):
+    if not os.path.exists(path): return None
+    with open(path) as f:
+        model = json.load(f)
+    model['weights'] = {int(b): w for b, w in model['weights'].items()}
+    model['idf'] = {int(b): w for b, w in model['idf'].items()}
+    return model
+
+def reject_probability(model, title, summary, category):
+    vec = vectorize(term_counts(title, summary, category), model['idf'], model['default_idf'])
+    weights = model['weights']
+    return sigmoid(model['bias'] + sum(weights.get(b, 0.0) * v for b, v in vec.items()))
+
+def evaluate(model, rows):
+    """Agreement with the LLM on held-out rows at the REJECT_CONFIDENCE cut-off."""
+    skipped = agreed = missed_gold = correct = 0
+    for title, summary, category, score in rows:
+        p = reject_probability(model, title, summary, category)
+        is_reject = score <= REJECT_MAX
+        correct += (p >= 0.5) == is_reject
+        if p >= REJECT_CONFIDENCE:
+            skipped += 1
+            agreed += is_reject
+            missed_gold += score >= 8
+    return {
+        'holdout_rows': len(rows),
+        'accuracy': round(correct / len(rows), 3) if rows else 0,
+        'skip_rate': round(skipped / len(rows), 3) if rows else 0,
+        'skip_precision': round(agreed / skipped, 3) if skipped else 0,
+        'missed_8_plus': missed_gold,
+    }
+
+def retrain(db_path=DB_PATH):
+    # Only learn from real LLM scores, never from the model's own guesses
+    rows = get_training_rows(get_conn(db_path))
+
+    if len(rows) < MIN_TRAINING_ROWS:
+        print(f"📉 TRIAGE: Only {len(rows)} LLM-scored stories, need {MIN_TRAINING_ROWS} to train.")
+        return None
+
+    random.Random(7).shuffle(rows)
+    split = int(len(rows) * (1 - HOLDOUT_FRACTION))
+    train_rows, holdout_rows = rows[:split], rows[split:]
+
+    print(f"\n🎓 TRAINING TRIAGE MODEL: {len(train_rows)} train / {len(holdout_rows)} held out")
+    print("-" * 65)
+
+    counts = [term_counts(t, s, cat) for t, s, cat, _ in train_rows]
+    doc_freq = {}
+    for doc in counts:
+        for b in doc:
+            doc_freq[b] = doc_freq.get(b, 0) + 1
+    n_docs = len(counts)
+    idf = {b: math.log((1 + n_docs) / (1 + df)) + 1 for b, df in doc_freq.items()}
+    default_idf = math.log(1 + n_docs) + 1
+
+    vectors = [vectorize(doc, idf, default_idf) for doc in counts]
+    labels = [1 if score <= REJECT_MAX else 0 for _, _, _, score in train_rows]
+    weights, bias = train_logistic(vectors, labels)
+
+    reject_scores = sorted(score for *_, score in train_rows if score <= REJECT_MAX) or [1]
+    model = {
+        'trained_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'reject_score': reject_scores[len(reject_scores) // 2],  # What a skipped story is stored as
+        'bias': bias,
+        'default_idf': default_idf,
+        # Rounded and pruned so the file stays a few MB at most
+        'weights': {b: round(w, 5) for b, w in weights.items() if abs(w) > 1e-4},
+        'idf': {b: round(v, 4) for b, v in idf.items()},
+    }
+    model['metrics'] = evaluate(model, holdout_rows)
+
+    with open(MODEL_PATH, 'w') as f:
+        json.dump(model, f)
+
+    m = model['metrics']
+    print(f"   Accuracy vs LLM (reject / keep): {m['accuracy']:.1%}")
+    print(f"   Would skip the LLM for:          {m['skip_rate']:.1%} of held-out stories")
+    print(f"   LLM agreed those were rejects:   {m['skip_precision']:.1%}")
+    print(f"   8+ stories wrongly skipped:      {m['missed_8_plus']}")
+    print("-" * 65)
+    print(f"✅ TRIAGE MODEL SAVED: {MODEL_PATH}")
+    return model
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] != 'retrain':
+        print("Usage: python triage.py [retrain]")
+    else:
+        retrain()